@@ -0,0 +1,201 @@
+# coding: utf-8
+'''
+Opt-in on-disk cache for parsed traces.
+
+Parsing large Batsim or SWF traces is costly, so :py:class:`JobSet` and
+:py:class:`Workload` can store the result of the parsing in a cache
+directory. Each entry is a directory of ``.npy`` files, one per column,
+which are memory-mapped when the same trace is loaded again.
+
+Entries are keyed by the absolute path, the size and the modification time
+of the trace: a modified trace is parsed again. The total size of the cache
+directory is capped and the least recently used entries are evicted first.
+
+For example:
+
+>>> from evalys.jobset import JobSet
+>>> js = JobSet.from_csv("./examples/jobs.csv", cache=True)
+>>> # the second load reads the cache entry
+>>> js = JobSet.from_csv("./examples/jobs.csv", cache=True)
+'''
+from __future__ import unicode_literals, print_function
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.join('~', '.cache')), 'evalys')
+
+DEFAULT_MAX_SIZE = 2 * 1024 ** 3
+
+_META_FILE = 'meta.json'
+
+
+class TraceCache(object):
+    '''
+    A directory of cached parsed traces with a size cap and LRU eviction.
+
+    :param directory: the cache directory. Default: ``$XDG_CACHE_HOME/evalys``
+        or ``~/.cache/evalys``
+    :param max_size: maximum size of the cache directory in bytes.
+        Default: 2GiB
+    '''
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self.directory = os.path.expanduser(directory or DEFAULT_CACHE_DIR)
+        self.max_size = max_size
+
+    @classmethod
+    def from_option(cls, cache):
+        '''
+        Interpret the `cache` option given to the `from_csv` methods: it can
+        be ``None``/``False`` (no cache), ``True`` (default cache), a
+        directory path or a :py:class:`TraceCache`.
+        '''
+        if cache is None or cache is False:
+            return None
+        if cache is True:
+            return cls()
+        if isinstance(cache, TraceCache):
+            return cache
+        return cls(directory=cache)
+
+    def _entry(self, filename, kind):
+        stat = os.stat(filename)
+        ident = '\0'.join([kind, os.path.abspath(filename),
+                           str(stat.st_size), str(stat.st_mtime_ns)])
+        key = hashlib.sha1(ident.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key)
+
+    def load(self, filename, kind):
+        '''
+        Load the cache entry of `filename` for the given kind of object.
+
+        :returns: ``None`` if there is no valid entry, or a tuple
+            ``(df, arrays, attributes)`` with the memory-mapped dataframe,
+            the dict of extra arrays and the dict of attributes given to
+            :py:meth:`store`.
+        '''
+        entry = self._entry(filename, kind)
+        meta_file = os.path.join(entry, _META_FILE)
+        try:
+            with open(meta_file, 'r') as f:
+                meta = json.load(f)
+            # mark the entry as recently used
+            os.utime(meta_file)
+
+            def load_array(name):
+                # copy-on-write mapping: the arrays can be modified in
+                # memory without changing the entry
+                return np.load(os.path.join(entry, name + '.npy'),
+                               mmap_mode='c')
+
+            columns = {}
+            for index, (column, col_kind) in enumerate(meta['columns']):
+                if col_kind == 'placeholder':
+                    values = np.full(meta['nb_rows'], None, dtype=object)
+                else:
+                    values = load_array('c{}'.format(index))
+                if col_kind == 'object':
+                    values = values.astype(object)
+                    values[load_array('c{}.null'.format(index))] = np.nan
+                columns[column] = values
+            arrays = {name: load_array('a.' + name)
+                      for name in meta['arrays']}
+        except (OSError, ValueError, KeyError):
+            return None
+        df = pd.DataFrame(columns, columns=[c for c, _ in meta['columns']],
+                          copy=False)
+        return df, arrays, meta['attributes']
+
+    def store(self, filename, kind, df, arrays=None, placeholders=(),
+              attributes=None):
+        '''
+        Store a cache entry for `filename` then evict the least recently
+        used entries if the cache is too large.
+
+        :param df: the dataframe to store column by column
+        :param arrays: a dict of extra numpy arrays to store
+        :param placeholders: columns of `df` not to store, they are filled
+            with ``None`` when loaded
+        :param attributes: a JSON serializable dict of attributes
+        '''
+        arrays = arrays or {}
+        entry = self._entry(filename, kind)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        tmp_entry = tempfile.mkdtemp(dir=self.directory, prefix='.tmp')
+        try:
+            meta = {
+                'nb_rows': len(df),
+                'columns': [],
+                'arrays': sorted(arrays),
+                'attributes': attributes or {},
+            }
+            for index, column in enumerate(df.columns):
+                path = os.path.join(tmp_entry, 'c{}'.format(index))
+                if column in placeholders:
+                    col_kind = 'placeholder'
+                elif df[column].dtype.kind in 'biufcmM':
+                    col_kind = 'numeric'
+                    np.save(path, df[column].values)
+                else:
+                    col_kind = 'object'
+                    np.save(path, np.asarray(df[column].astype(str),
+                                             dtype=str))
+                    np.save(path + '.null', df[column].isnull().values)
+                meta['columns'].append((column, col_kind))
+            for name, values in arrays.items():
+                np.save(os.path.join(tmp_entry, 'a.' + name),
+                        np.asarray(values))
+            with open(os.path.join(tmp_entry, _META_FILE), 'w') as f:
+                json.dump(meta, f)
+            if os.path.isdir(entry):
+                shutil.rmtree(entry)
+            os.rename(tmp_entry, entry)
+        except Exception:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            raise
+        self.evict()
+
+    def entries(self):
+        '''
+        :returns: a list of ``(last_use, size, path)`` of the cache entries
+            sorted from the least to the most recently used.
+        '''
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            meta_file = os.path.join(path, _META_FILE)
+            if name.startswith('.') or not os.path.isfile(meta_file):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, f))
+                       for f in os.listdir(path))
+            entries.append((os.path.getmtime(meta_file), size, path))
+        return sorted(entries)
+
+    def evict(self):
+        '''
+        Remove the least recently used entries until the cache size is
+        below :py:attr:`max_size`.
+        '''
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        '''
+        Remove all the cache entries.
+        '''
+        for _, _, path in self.entries():
+            shutil.rmtree(path, ignore_errors=True)
@@ -17,7 +17,7 @@ if not os.environ.get('DISPLAY'):
 
 import matplotlib.pyplot as plt
 from evalys.jobset import JobSet
-from evalys.visu.legacy import plot_gantt_general_shape, available_series, plot_series
+from evalys.visu.legacy import plot_gantt, plot_gantt_general_shape, available_series, plot_series
 
 
 def unique_file_name(file_dict, file_name, index=1):
@@ -46,6 +46,10 @@ def main():
                         action='store_true',
                         default=False,
                         help='Generate a gantt diff comparison between inputs (no more than 3 recommended')
+    parser.add_argument('--raster', '-r',
+                        choices=['auto', 'on', 'off'],
+                        default='auto',
+                        help='Paint the Gantt charts as images (on) or draw them as vector shapes (off). By default (auto), only the Gantt charts of large jobsets are painted')
 
     args = parser.parse_args()
     if NO_GRAPHICS and not args.output:
@@ -88,6 +92,8 @@ def main():
         ax_shape = ax_list[-1:][0]
         ax_list = ax_list[:-1]
 
+    raster = {'auto': None, 'on': True, 'off': False}[args.raster]
+
     # generate josets from CSV inputs
     jobsets = {}
     index = 0
@@ -97,7 +103,7 @@ def main():
         file_name = unique_file_name(jobsets, file_name)
         jobsets[file_name] = js
         if args.gantt:
-            js.gantt(ax=ax_list[index], title=file_name)
+            plot_gantt(js, ax=ax_list[index], title=file_name, raster=raster)
             index += 1
 
     if args.gantt_diff:
@@ -0,0 +1,137 @@
+# coding: utf-8
+'''
+Static interval tree to find the jobs running or queued at a given time.
+
+The tree is built once over the begin and end times of the jobs (e.g.
+`starting_time` and `finish_time` for the running jobs) with NumPy sorts
+only. Finding the jobs whose interval contains a time costs
+O(log² n + k) for k results, and counting them for an array of times is a
+vectorized binary search.
+
+For example:
+
+>>> from evalys.jobset import JobSet
+>>> js = JobSet.from_csv("./examples/jobs.csv")
+>>> running = js.jobs_running_at(1000)
+>>> nb_running = js.nb_jobs_running_at([0, 1000, 2000])
+'''
+from __future__ import unicode_literals, print_function
+import numpy as np
+
+
+class IntervalTree(object):
+    '''
+    Centered interval tree over closed intervals ``[begin, end]``, stored in
+    flat arrays.
+
+    The bounds are ranked among all the bounds and each interval belongs to
+    the node of the implicit binary tree over the ranks that splits its
+    begin rank from its end rank, i.e. the highest bit where they differ.
+    All the intervals of a node contain its center, so a query time only
+    visits the nodes on the path to its rank and takes a prefix of the
+    intervals sorted by begin or a suffix of the intervals sorted by end.
+
+    Intervals with a missing bound or ending before they begin are not
+    indexed.
+
+    :param begins: the begin times of the intervals
+    :param ends: the end times of the intervals
+    '''
+    def __init__(self, begins, ends):
+        begins = np.asarray(begins, dtype=float)
+        ends = np.asarray(ends, dtype=float)
+        valid = begins <= ends
+        self.positions = np.flatnonzero(valid)
+        begins = begins[valid]
+        ends = ends[valid]
+
+        # for the counts
+        self.sorted_begins = np.sort(begins)
+        self.sorted_ends = np.sort(ends)
+        self.begin_order = np.argsort(begins, kind='stable')
+
+        # rank the bounds and find the node of each interval
+        self.coords, ranks = np.unique(np.concatenate([begins, ends]),
+                                       return_inverse=True)
+        begin_ranks = ranks[:len(begins)]
+        end_ranks = ranks[len(begins):]
+        self.depth = max(1, int(len(self.coords) - 1).bit_length())
+        levels = _bit_length(begin_ranks ^ end_ranks)
+        keys = self._node_keys(levels, begin_ranks >> levels)
+
+        by_begin = np.lexsort((begins, keys))
+        by_end = np.lexsort((ends, keys))
+        self.node_keys = keys[by_begin]
+        self.node_begin_order = by_begin
+        self.node_begins = begins[by_begin]
+        self.node_end_order = by_end
+        self.node_ends = ends[by_end]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _node_keys(self, levels, prefixes):
+        return (levels.astype(np.int64) << (self.depth + 1)) + prefixes
+
+    def at(self, time):
+        '''
+        :returns: the sorted positions of the intervals that contain `time`
+        '''
+        rank = np.searchsorted(self.coords, time, side='right') - 1
+        if rank < 0 or len(self.positions) == 0:
+            return np.array([], dtype=np.int64)
+        levels = np.arange(self.depth + 1)
+        keys = self._node_keys(levels, rank >> levels)
+        los = np.searchsorted(self.node_keys, keys, side='left')
+        his = np.searchsorted(self.node_keys, keys, side='right')
+        found = []
+        for level, lo, hi in zip(levels, los, his):
+            if lo == hi:
+                continue
+            if level > 0 and not (rank >> (level - 1)) & 1:
+                # on the left of the center: all end after `time`
+                stop = lo + np.searchsorted(self.node_begins[lo:hi], time,
+                                            side='right')
+                found.append(self.node_begin_order[lo:stop])
+            else:
+                # on the right of the center: all begin before `time`
+                start = lo + np.searchsorted(self.node_ends[lo:hi], time,
+                                             side='left')
+                found.append(self.node_end_order[start:hi])
+        if not found:
+            return np.array([], dtype=np.int64)
+        return np.sort(self.positions[np.concatenate(found)])
+
+    def overlapping(self, begin, end):
+        '''
+        :returns: the sorted positions of the intervals that overlap
+            ``[begin, end]``
+        '''
+        # the intervals that contain `begin` and the ones that begin after
+        # it in the period
+        lo = np.searchsorted(self.sorted_begins, begin, side='right')
+        hi = np.searchsorted(self.sorted_begins, end, side='right')
+        later = self.positions[self.begin_order[lo:hi]]
+        return np.sort(np.concatenate([self.at(begin), later]))
+
+    def count_at(self, times):
+        '''
+        :returns: the number of intervals that contain each time of `times`
+        '''
+        return (np.searchsorted(self.sorted_begins, times, side='right') -
+                np.searchsorted(self.sorted_ends, times, side='left'))
+
+    def count_overlapping(self, begins, ends):
+        '''
+        :returns: the number of intervals that overlap each period
+            ``[begins[i], ends[i]]``
+        '''
+        return (np.searchsorted(self.sorted_begins, ends, side='right') -
+                np.searchsorted(self.sorted_ends, begins, side='left'))
+
+
+def _bit_length(values):
+    '''
+    Vectorized `int.bit_length` of non-negative integers (below 2**53).
+    '''
+    return np.frexp(values.astype(float))[1].astype(np.int64)
@@ -1,12 +1,108 @@
 # coding: utf-8
 from __future__ import unicode_literals, print_function
+import bisect
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from evalys import visu
-import evalys.visu.legacy as vleg
 from procset import ProcInt, ProcSet
-from evalys.metrics import compute_load, load_mean, fragmentation_reis, fragmentation
+from evalys.cache import TraceCache
+from evalys.intervals import IntervalTree
+from evalys.utils import open_trace
+from evalys.metrics import compute_load, load_mean, LoadIndex, fragmentation_reis, fragmentation, \
+    LoadAccumulator, MeanAccumulator, POSTPONE_DELAY
+
+# default memory budget of JobSet.occupancy_matrix in bytes
+OCCUPANCY_MAX_MEMORY = 512 * 1024 ** 2
+
+# columns stored in ticks when a JobSet has a time resolution
+TIME_COLUMNS = ['submission_time', 'requested_time', 'starting_time',
+                'execution_time', 'finish_time', 'waiting_time',
+                'turnaround_time']
+
+
+def seconds_to_ticks(values, time_resolution):
+    '''
+    Convert times in seconds into int64 ticks of `time_resolution` seconds,
+    rounded to the nearest tick. The ``-1`` values (unknown or still
+    running) are kept as is.
+    '''
+    values = np.asarray(values, dtype=float)
+    if np.isnan(values).any():
+        raise ValueError('Missing time values cannot be stored as ticks')
+    return np.where(values == -1, -1,
+                    np.round(values / time_resolution)).astype(np.int64)
+
+
+def ticks_to_seconds(ticks, time_resolution):
+    '''
+    Convert int64 ticks of `time_resolution` seconds back into times in
+    seconds. The ``-1`` values are kept as is.
+    '''
+    ticks = np.asarray(ticks)
+    return np.where(ticks == -1, -1., ticks * time_resolution)
+
+
+def parse_allocated_resources(allocated_resources):
+    '''
+    Parse a whole `allocated_resources` column at once into flat interval
+    arrays in a CSR like layout: the intervals of the i-th job are
+    ``inf[offsets[i]:offsets[i + 1]]`` and ``sup[offsets[i]:offsets[i + 1]]``.
+
+    The column can either contain string representations of interval sets
+    (``"1-2 5 10-50"``) or :py:class:`ProcSet` objects. The intervals of each
+    job are sorted and merged like a :py:class:`ProcSet` would do.
+
+    :returns: a tuple of three int64 numpy arrays ``(offsets, inf, sup)``
+    '''
+    values = pd.Series(allocated_resources).reset_index(drop=True)
+    nb_jobs = len(values)
+
+    if values.map(lambda x: isinstance(x, ProcSet)).all():
+        intervals = np.array([(job, itv.inf, itv.sup)
+                              for job, pset in enumerate(values)
+                              for itv in pset.intervals()],
+                             dtype=np.int64).reshape(-1, 3)
+        job_ids, inf, sup = intervals.T
+    else:
+        # use a separator token between jobs to keep track of the job of
+        # each interval token
+        tokens = np.array(
+            ' ; '.join(values.fillna('').astype(str)).split() + [';'])
+        separators = tokens == ';'
+        job_ids = np.cumsum(separators)[~separators]
+        bounds = np.char.partition(tokens[~separators], '-')
+        inf = bounds[:, 0].astype(float).astype(np.int64)
+        sup = np.where(bounds[:, 1] == '-', bounds[:, 2], bounds[:, 0])
+        sup = sup.astype(float).astype(np.int64)
+
+    # sort intervals by job then by lower bound and merge the overlapping or
+    # contiguous ones
+    order = np.lexsort((inf, job_ids))
+    job_ids, inf, sup = job_ids[order], inf[order], sup[order]
+    if len(inf):
+        span = sup.max() - inf.min() + 2
+        shift = job_ids * span
+        sup_cummax = np.maximum.accumulate(sup + shift) - shift
+        itv_begin = np.ones(len(inf), dtype=bool)
+        itv_begin[1:] = ((job_ids[1:] != job_ids[:-1]) |
+                         (inf[1:] > sup_cummax[:-1] + 1))
+        starts = np.flatnonzero(itv_begin)
+        job_ids = job_ids[starts]
+        inf = inf[starts]
+        sup = np.maximum.reduceat(sup, starts)
+
+    offsets = np.zeros(nb_jobs + 1, dtype=np.int64)
+    np.cumsum(np.bincount(job_ids, minlength=nb_jobs), out=offsets[1:])
+    return offsets, inf, sup
+
+
+def allocation_sizes(offsets, inf, sup):
+    '''
+    :returns: the number of allocated resources of each job from the
+        interval arrays given by :py:func:`parse_allocated_resources`.
+    '''
+    sizes = np.zeros(len(inf) + 1, dtype=np.int64)
+    np.cumsum(sup - inf + 1, out=sizes[1:])
+    return np.diff(sizes[offsets])
 
 
 class JobSet(object):
@@ -26,10 +122,24 @@ class JobSet(object):
         # strinf representation
         1-2 5 10-50
 
+    The allocations are parsed once into flat interval arrays stored in
+    :py:attr:`alloc_offsets`, :py:attr:`alloc_inf` and :py:attr:`alloc_sup`
+    (see :py:func:`parse_allocated_resources`). The :py:class:`ProcSet`
+    objects of the `allocated_resources` column are only built when the
+    :py:attr:`df` attribute is first accessed.
+
     .. warning:: Floating point precision is set to
         :py:attr:`self.float_precision` so all floating point values are
         rounded with this number of digits. Defalut set to 6
 
+    If a `time_resolution` (in seconds) is given, the time columns (see
+    :py:data:`TIME_COLUMNS`) are instead stored as int64 ticks of this
+    resolution and the floating point values are not rounded. The derived
+    columns are computed with integer arithmetic so events are ordered
+    exactly. All the times given to or returned by the methods are then in
+    ticks, they are converted back to seconds by :py:meth:`to_csv`, the
+    plots and :py:meth:`in_seconds`.
+
     For example:
 
     >>> from evalys.jobset import JobSet
@@ -43,71 +153,91 @@ class JobSet(object):
 
     >>> js = JobSet.from_csv("./examples/jobs.csv",
     ...                      resource_bounds=(0, 63))
+
+    Or store the times as microseconds:
+
+    >>> js = JobSet.from_csv("./examples/jobs.csv", time_resolution=1e-6)
     '''
-    def __init__(self, df, resource_bounds=None, float_precision=6):
+    def __init__(self, df, resource_bounds=None, float_precision=6,
+                 time_resolution=None):
         # reset the index of the dataframe
         df = df.reset_index(drop=True)
         # set float round precision
         self.float_precision = float_precision
-        self.df = np.round(df, float_precision)
-
-        if resource_bounds:
-            self.res_bounds = ProcInt(*resource_bounds)
+        self.time_resolution = time_resolution
+        if time_resolution is None:
+            self._df = np.round(df, float_precision)
         else:
-            def alloc_apply(f, alloc):
-                for pset in  alloc:
-                    try:
-                        yield f(pset)
-                    except ValueError:
-                        pass
-
-            self.res_bounds = ProcInt(
-                min(alloc_apply(lambda pset: pset.min, self.df.allocated_resources)),
-                max(alloc_apply(lambda pset: pset.max, self.df.allocated_resources))
-            )
-        self.MaxProcs = len(self.res_bounds)
+            # the index reset already gave us a copy
+            self._df = df
+            for col in TIME_COLUMNS:
+                if col in df.columns:
+                    df[col] = seconds_to_ticks(df[col], time_resolution)
+
+        # parse allocations once, ProcSet objects are built on demand
+        self.alloc_offsets, self.alloc_inf, self.alloc_sup = \
+            parse_allocated_resources(self._df.allocated_resources)
+        self._lazy_procsets = not self._df.allocated_resources.map(
+            lambda x: isinstance(x, ProcSet)).all()
 
-        self.df['proc_alloc'] = self.df.allocated_resources.apply(len)
+        self._set_res_bounds(resource_bounds)
+
+        self._df['proc_alloc'] = allocation_sizes(
+            self.alloc_offsets, self.alloc_inf, self.alloc_sup)
 
         # Add missing columns if possible
         fillable_relative = all(
-            col in self.df.columns
+            col in self._df.columns
             for col in ['submission_time', 'waiting_time', 'execution_time']
         )
         fillable_absolute = all(
-            col in self.df.columns
+            col in self._df.columns
             for col in ['submission_time', 'starting_time', 'finish_time']
         )
         if fillable_relative:
-            if 'starting_time' not in self.df.columns:
-                self.df['starting_time'] = \
-                    self.df['submission_time'] + self.df['waiting_time']
-            if 'finish_time' not in self.df.columns:
-                self.df['finish_time'] = \
-                    self.df['starting_time'] + self.df['execution_time']
+            if 'starting_time' not in self._df.columns:
+                self._df['starting_time'] = \
+                    self._df['submission_time'] + self._df['waiting_time']
+            if 'finish_time' not in self._df.columns:
+                self._df['finish_time'] = \
+                    self._df['starting_time'] + self._df['execution_time']
         elif fillable_absolute:
-            if 'waiting_time' not in self.df.columns:
-                self.df['waiting_time'] = \
-                    self.df['starting_time'] - self.df['submission_time']
-            if 'execution_time' not in self.df.columns:
-                self.df['execution_time'] = \
-                    self.df['finish_time'] - self.df['starting_time']
+            if 'waiting_time' not in self._df.columns:
+                self._df['waiting_time'] = \
+                    self._df['starting_time'] - self._df['submission_time']
+            if 'execution_time' not in self._df.columns:
+                self._df['execution_time'] = \
+                    self._df['finish_time'] - self._df['starting_time']
 
-        if 'job_id' in self.df.columns:
-            self.df.rename(columns={'job_id': 'jobID'}, inplace=True)
+        if 'job_id' in self._df.columns:
+            self._df.rename(columns={'job_id': 'jobID'}, inplace=True)
 
         # TODO check consistency on calculated columns...
 
         # init cache
         self._utilisation = None
+        self._utilisation_index = None
         self._queue = None
+        self._running_index = None
+        self._queued_index = None
+
+    def _set_res_bounds(self, resource_bounds=None):
+        if resource_bounds:
+            self.res_bounds = ProcInt(*resource_bounds)
+        else:
+            self.res_bounds = ProcInt(int(self.alloc_inf.min()),
+                                      int(self.alloc_sup.max()))
+        self.MaxProcs = len(self.res_bounds)
 
     __converters = {
         'jobID': str,
         'job_id': str,
         'workload': str,
         'profile': str,
-        'allocated_resources': ProcSet.from_str,
+    }
+
+    __dtypes = {
+        'allocated_resources': str,
     }
 
     columns = ['job_id',
@@ -125,26 +255,211 @@ class JobSet(object):
                'allocated_resources']
 
     @classmethod
-    def from_csv(cls, filename, resource_bounds=None):
-        df = pd.read_csv(filename, converters=cls.__converters)
-        return cls(df, resource_bounds=resource_bounds)
+    def from_csv(cls, filename, resource_bounds=None, cache=None,
+                 time_resolution=None):
+        '''
+        Import a Batsim jobs CSV file. Compressed files (e.g.
+        ``out_jobs.csv.xz``) are decompressed on the fly.
+
+        :param cache: if set, use an on-disk cache of the parsed jobset (see
+            :py:mod:`evalys.cache`). It can be ``True`` to use the default
+            cache directory, a directory path or a
+            :py:class:`~evalys.cache.TraceCache`.
+        :param time_resolution: if set, store the times as int64 ticks of
+            this number of seconds (e.g. ``1e-6``), see :py:class:`JobSet`.
+        '''
+        cache = TraceCache.from_option(cache)
+        kind = 'jobset'
+        if time_resolution is not None:
+            kind = 'jobset-ticks-{!r}'.format(time_resolution)
+        if cache is not None:
+            entry = cache.load(filename, kind)
+            if entry is not None:
+                return cls._from_cache_entry(*entry,
+                                             resource_bounds=resource_bounds)
+
+        df = pd.read_csv(filename, converters=cls.__converters,
+                         dtype=cls.__dtypes)
+        js = cls(df, resource_bounds=resource_bounds,
+                 time_resolution=time_resolution)
+
+        if cache is not None:
+            cache.store(filename, kind, js._df,
+                        arrays={'alloc_offsets': js.alloc_offsets,
+                                'alloc_inf': js.alloc_inf,
+                                'alloc_sup': js.alloc_sup},
+                        placeholders=['allocated_resources'],
+                        attributes={'float_precision': js.float_precision,
+                                    'time_resolution': js.time_resolution})
+        return js
+
+    @classmethod
+    def iter_csv(cls, filename, chunksize=100000, resource_bounds=None,
+                 time_resolution=None):
+        '''
+        Import a Batsim jobs CSV file chunk by chunk.
+
+        :param chunksize: the number of jobs of each chunk
+        :returns: an iterator over partial jobsets of at most `chunksize`
+            jobs each.
+
+        For example:
+
+        >>> from evalys.jobset import JobSet
+        >>> for js in JobSet.iter_csv("./examples/jobs.csv", chunksize=100):
+        ...     print(js.df.waiting_time.max())
+        '''
+        for df in cls._iter_csv_frames(filename, chunksize):
+            yield cls(df, resource_bounds=resource_bounds,
+                      time_resolution=time_resolution)
+
+    @classmethod
+    def _iter_csv_frames(cls, filename, chunksize):
+        return pd.read_csv(filename, converters=cls.__converters,
+                           dtype=cls.__dtypes, chunksize=chunksize)
 
-    def to_csv(self, filename):
+    @classmethod
+    def stream_metrics(cls, filename, chunksize=100000):
+        '''
+        Compute the summary metrics of a Batsim jobs CSV file without
+        loading it at once: the chunks of jobs are folded into running
+        accumulators. The chunks are not turned into jobsets, only the
+        number of allocated resources of each job is computed.
+
+        :returns: a dict with the `utilisation` and `queue` load dataframes
+            (as given by :py:attr:`utilisation` and :py:attr:`queue`), the
+            `mean_utilisation` and the `mean_waiting_time`.
+        '''
+        utilisation = LoadAccumulator('starting_time', 'finish_time',
+                                      'proc_alloc')
+        queue = LoadAccumulator('submission_time', 'starting_time',
+                                'requested_number_of_resources')
+        waiting_time = MeanAccumulator('waiting_time')
+        for df in cls._iter_csv_frames(filename, chunksize):
+            df['proc_alloc'] = allocation_sizes(
+                *parse_allocated_resources(df['allocated_resources']))
+            utilisation.add(df)
+            queue.add(df)
+            waiting_time.add(df)
+
+        return {
+            'utilisation': utilisation.load,
+            'queue': queue.load,
+            'mean_utilisation': load_mean(utilisation.load),
+            'mean_waiting_time': waiting_time.mean,
+        }
+
+    @classmethod
+    def _from_cache_entry(cls, df, arrays, attributes, resource_bounds=None):
+        # the cached dataframe is already rounded and completed
+        js = cls.__new__(cls)
+        js.float_precision = attributes['float_precision']
+        js.time_resolution = attributes.get('time_resolution')
+        js._df = df
+        js.alloc_offsets = arrays['alloc_offsets']
+        js.alloc_inf = arrays['alloc_inf']
+        js.alloc_sup = arrays['alloc_sup']
+        js._lazy_procsets = True
+        js._set_res_bounds(resource_bounds)
+        js._utilisation = None
+        js._utilisation_index = None
+        js._queue = None
+        js._running_index = None
+        js._queued_index = None
+        return js
+
+    @property
+    def df(self):
+        '''
+        The dataframe of the jobs. The `allocated_resources` column is
+        converted to :py:class:`ProcSet` objects on first access.
+        '''
+        if self._lazy_procsets:
+            self._df['allocated_resources'] = [
+                self.allocated_procset(job) for job in range(len(self._df))]
+            self._lazy_procsets = False
+        return self._df
+
+    def column(self, name):
+        '''
+        :returns: the column `name` of :py:attr:`df`. The
+            `allocated_resources` column is only converted to
+            :py:class:`ProcSet` objects if it is the requested one.
+        '''
+        if name == 'allocated_resources':
+            return self.df[name]
+        return self._df[name]
+
+    def to_ticks(self, times):
+        '''
+        Convert times in seconds into the time unit of this jobset: ticks if
+        it has a time resolution, else they are returned as is.
+        '''
+        if self.time_resolution is None:
+            return times
+        return seconds_to_ticks(times, self.time_resolution)
+
+    def to_seconds(self, times):
+        '''
+        Convert times of this jobset into seconds, see :py:meth:`to_ticks`.
+        '''
+        if self.time_resolution is None:
+            return times
+        return ticks_to_seconds(times, self.time_resolution)
+
+    def in_seconds(self):
+        '''
+        :returns: this jobset with its times in seconds: a new jobset
+            sharing the allocation arrays if it has a time resolution, or
+            itself.
+        '''
+        if self.time_resolution is None:
+            return self
+        df = self._df.copy()
+        for col in TIME_COLUMNS:
+            if col in df.columns:
+                df[col] = self.to_seconds(df[col].values)
+        js = JobSet._from_cache_entry(
+            df,
+            {'alloc_offsets': self.alloc_offsets,
+             'alloc_inf': self.alloc_inf,
+             'alloc_sup': self.alloc_sup},
+            {'float_precision': self.float_precision},
+            resource_bounds=(self.res_bounds.inf, self.res_bounds.sup))
+        js._lazy_procsets = self._lazy_procsets
+        return js
+
+    def allocated_procset(self, job):
+        '''
+        :returns: the resources allocated to the job at position `job` as a
+            :py:class:`ProcSet` built from the interval arrays.
+        '''
+        begin, end = self.alloc_offsets[job], self.alloc_offsets[job + 1]
+        return ProcSet(*zip(self.alloc_inf[begin:end].tolist(),
+                            self.alloc_sup[begin:end].tolist()))
+
+    def to_csv(self, filename, compression='infer'):
         """ Export this jobset to a csv file with a ',' as separator.
 
+        :param compression: compression of the exported file, by default it
+            is inferred from the file extension (e.g. ``jobs.csv.gz``). See
+            :py:func:`evalys.utils.open_trace`.
+
         Example:
 
         >>> from evalys.jobset import JobSet
         >>> js = JobSet.from_csv("./examples/jobs.csv")
         >>> js.to_csv("/tmp/jobs.csv")
         """
-        df = self.df.copy()
+        df = self.in_seconds().df.copy()
         df.allocated_resources = df.allocated_resources.apply(str)
-        with open(filename, 'w') as f:
+        with open_trace(filename, 'wt', compression) as f:
             df.to_csv(f, index=False, sep=",",
                       float_format='%.{}f'.format(self.float_precision))
 
     def gantt(self, time_scale=False, **kwargs):
+        # plotting libraries are only loaded when plotting
+        from evalys import visu
         if time_scale:
             kwargs['xscale'] = 'time'
         visu.plot_gantt(self, **kwargs)
@@ -153,10 +468,12 @@ class JobSet(object):
     def utilisation(self):
         if self._utilisation is not None:
             return self._utilisation
-        self._utilisation = compute_load(self.df,
-                                         col_begin='starting_time',
-                                         col_end='finish_time',
-                                         col_cumsum='proc_alloc')
+        self._utilisation = compute_load(
+            self._df,
+            col_begin='starting_time',
+            col_end='finish_time',
+            col_cumsum='proc_alloc',
+            postpone_delay=self.to_ticks(POSTPONE_DELAY))
         return self._utilisation
 
     @property
@@ -172,15 +489,16 @@ class JobSet(object):
             return self._queue
 
         proc = "requested_number_of_resources"
-        self._queue = compute_load(self.df, 'submission_time', 'starting_time',
-                                   proc)
+        self._queue = compute_load(
+            self._df, 'submission_time', 'starting_time', proc,
+            postpone_delay=self.to_ticks(POSTPONE_DELAY))
         return self._queue
 
     def reset_time(self, to=0):
         '''
         Reset the time index by giving the first submission time as 1
         '''
-        df = self.df
+        df = self._df
         if not to:
             reset_value = df['submission_time'].min() - 1
         else:
@@ -190,9 +508,18 @@ class JobSet(object):
 
         self._queue = None
         self._utilisation = None
+        self._utilisation_index = None
+        self._running_index = None
+        self._queued_index = None
 
     def plot(self, normalize=False, with_details=False, time_scale=False,
              title=None):
+        if self.time_resolution is not None:
+            return self.in_seconds().plot(normalize, with_details,
+                                          time_scale, title)
+        # plotting libraries are only loaded when plotting
+        import matplotlib.pyplot as plt
+        import evalys.visu.legacy as vleg
         nrows = 2
         if with_details:
             nrows = nrows + 2
@@ -206,138 +533,314 @@ class JobSet(object):
                        legend_label="queue", ax=axe[1], normalize=normalize,
                        time_scale=time_scale)
         if with_details:
-            vleg.plot_job_details(self.df, self.MaxProcs, ax=axe[2],
+            vleg.plot_job_details(self._df, self.MaxProcs, ax=axe[2],
                                   time_scale=time_scale)
             vleg.plot_gantt(self, ax=axe[3], time_scale=time_scale)
 
     def detailed_utilisation(self):
-        df = self.free_intervals()
-        df['total'] = len(self.res_bounds) - df.free_itvs.apply(len)
+        times, free_itvs, nb_free = self._sweep_free_intervals()
+        df = pd.DataFrame({'time': times, 'free_itvs': free_itvs})
+        df['total'] = len(self.res_bounds) - nb_free
         df.set_index("time", drop=True, inplace=True)
         return df
 
+    @property
+    def utilisation_index(self):
+        '''
+        :py:class:`LoadIndex` on the utilisation, built once, to compute the
+        mean utilisation over many time windows.
+        '''
+        if self._utilisation_index is None:
+            self._utilisation_index = LoadIndex(self.utilisation)
+        return self._utilisation_index
+
     def mean_utilisation(self, begin_time=None, end_time=None):
-        return load_mean(self.utilisation, begin=begin_time, end=end_time)
+        '''
+        Mean utilisation from `begin_time` to `end_time`. Both can be arrays
+        to get the mean utilisation of many time windows at once.
+        '''
+        return self.utilisation_index.mean(begin=begin_time, end=end_time)
 
-    def free_intervals(self, begin_time=0, end_time=None):
+    @property
+    def running_index(self):
         '''
-        :returns: a dataframe with the free resources over time. Each line
-            corespounding to an event in the jobset.
+        :py:class:`~evalys.intervals.IntervalTree` of the jobs from their
+        starting time to their finish time, built once.
+        '''
+        if self._running_index is None:
+            self._running_index = IntervalTree(self._df['starting_time'],
+                                               self._df['finish_time'])
+        return self._running_index
+
+    @property
+    def queued_index(self):
+        '''
+        :py:class:`~evalys.intervals.IntervalTree` of the jobs from their
+        submission time to their starting time, built once.
+        '''
+        if self._queued_index is None:
+            self._queued_index = IntervalTree(self._df['submission_time'],
+                                              self._df['starting_time'])
+        return self._queued_index
+
+    def _jobs_at_positions(self, positions):
+        jobs = self._df.iloc[positions].copy()
+        if self._lazy_procsets:
+            jobs['allocated_resources'] = [
+                self.allocated_procset(job) for job in positions]
+        return jobs
+
+    def jobs_running_at(self, time):
+        '''
+        :returns: the jobs running at `time` (started and not finished)
+        '''
+        return self._jobs_at_positions(self.running_index.at(time))
+
+    def jobs_queued_at(self, time):
+        '''
+        :returns: the jobs in the queue at `time` (submitted and not
+            started)
+        '''
+        return self._jobs_at_positions(self.queued_index.at(time))
+
+    def jobs_running_between(self, begin_time, end_time):
+        '''
+        :returns: the jobs running at some point between `begin_time` and
+            `end_time`
+        '''
+        return self._jobs_at_positions(
+            self.running_index.overlapping(begin_time, end_time))
+
+    def nb_jobs_running_at(self, times):
+        '''
+        :returns: the number of jobs running at each time of `times`
+        '''
+        return self.running_index.count_at(times)
+
+    def nb_jobs_queued_at(self, times):
+        '''
+        :returns: the number of jobs in the queue at each time of `times`
         '''
-        df = self.df
+        return self.queued_index.count_at(times)
+
+    def _sweep_events(self, begin_time=0, end_time=None):
+        '''
+        Sort the start and stop events of the jobset, stop events first
+        when they happen at the same time than start events, and cut them
+        to the given period.
+
+        :returns: a tuple ``(times, grabs, jobs)`` where `times` starts with
+            `begin_time` (and ends with `end_time` if given) and each
+            following time is associated to an event: if the job at
+            position `jobs[i]` grabs (``True``) or frees its resources.
+        '''
+        df = self._df
+        nb_jobs = len(df)
 
         # Create a list of start and stop event associated to the proc
         # allocation:
         # Free -> Used : grab = 1
         # Used -> Free : grab = 0
-        event_columns = ['time', 'free_itvs', 'grab']
-        start_event_df = pd.concat([df['starting_time'],
-                                    df['allocated_resources'],
-                                    pd.Series(np.ones(len(df), dtype=bool))],
-                                   axis=1)
-        start_event_df.columns = event_columns
-        # Stop event have zero in grab
-        stop_event_df = pd.concat([df['finish_time'],
-                                   df['allocated_resources'],
-                                   pd.Series(np.zeros(len(df), dtype=bool))],
-                                  axis=1)
-        stop_event_df.columns = event_columns
-
-        # merge events and sort them
-        event_df = pd.concat([start_event_df, stop_event_df],
-            ignore_index=True).sort_values(
-                by=['time', 'grab']).reset_index(drop=True)
+        event_times = np.concatenate([df['starting_time'].values,
+                                      df['finish_time'].values])
+        event_grabs = np.concatenate([np.ones(nb_jobs, dtype=bool),
+                                      np.zeros(nb_jobs, dtype=bool)])
+        event_jobs = np.concatenate([np.arange(nb_jobs),
+                                     np.arange(nb_jobs)])
+
+        order = np.lexsort((event_grabs, event_times))
+        event_times = event_times[order]
 
         # cut events if necessary
-        # reindex event_df
-        event_df = event_df.sort_values(by='time').set_index(['time'],
-                                                             drop=False)
-        # find closest index
-        begin = event_df.index.searchsorted(begin_time)
+        begin = np.searchsorted(event_times, begin_time)
         if end_time is not None:
-            end = event_df.index.searchsorted(end_time)
+            end = np.searchsorted(event_times, end_time)
         else:
-            end = len(event_df.index) - 1
-
-        event_df = event_df.iloc[begin:end].reset_index(drop=True)
-
-        # All resources are free at the beginning
-        event_columns = ['time', 'free_itvs']
-        first_row = [begin_time, ProcSet(self.res_bounds)]
-        free_interval_serie = pd.DataFrame(columns=event_columns)
-        free_interval_serie.loc[0] = first_row
-        for index, row in event_df.iterrows():
-            current_itv = free_interval_serie.iloc[index]['free_itvs']
-            if row.grab:
-                new_itv = current_itv - row.free_itvs
+            end = len(event_times) - 1
+        order = order[begin:end]
+
+        bounds = [[begin_time], event_times[begin:end]]
+        if end_time is not None:
+            bounds.append([end_time])
+        return np.concatenate(bounds), event_grabs[order], event_jobs[order]
+
+    def _free_resources_at(self, time):
+        '''
+        :returns: the resources of :py:attr:`res_bounds` that are not
+            allocated to the jobs started before `time` and finishing after
+            it, as a :py:class:`ProcSet`. The events of these jobs are
+            before and after `time` so they are not part of the sweep
+            events starting at `time`.
+        '''
+        running = ((self._df['starting_time'].values < time) &
+                   (self._df['finish_time'].values > time))
+        busy = np.repeat(running, np.diff(self.alloc_offsets))
+        return ProcSet(self.res_bounds) - ProcSet(
+            *zip(self.alloc_inf[busy].tolist(), self.alloc_sup[busy].tolist()))
+
+    def _sweep_free_intervals(self, begin_time=0, end_time=None):
+        '''
+        Sweep once over the sorted start and stop events of the jobset and
+        maintain the set of free resources incrementally.
+
+        :returns: a tuple of three aligned arrays: the event times, the free
+            resources (as :py:class:`ProcSet`) after each event and the number
+            of free resources after each event.
+        '''
+        times, event_grabs, event_jobs = self._sweep_events(begin_time,
+                                                            end_time)
+        event_itvs = self.df['allocated_resources'].values[event_jobs]
+
+        nb_rows = len(times)
+        free_itvs = np.empty(nb_rows, dtype=object)
+        nb_free = np.empty(nb_rows, dtype=np.int64)
+
+        # All resources but the ones of the running jobs are free at the
+        # beginning
+        current_itv = self._free_resources_at(begin_time)
+        free_itvs[0] = current_itv
+        nb_free[0] = len(current_itv)
+        for index, (grab, itv) in enumerate(zip(event_grabs, event_itvs),
+                                            start=1):
+            if grab:
+                current_itv = current_itv - itv
             else:
-                new_itv = current_itv | row.free_itvs
-            new_row = [row.time, new_itv]
-            free_interval_serie.loc[index + 1] = new_row
+                current_itv = current_itv | itv
+            free_itvs[index] = current_itv
+            nb_free[index] = len(current_itv)
 
         if end_time is not None:
-            last_row = [end_time, ProcSet()]
-            free_interval_serie.loc[len(free_interval_serie)] = last_row
-        return free_interval_serie
+            free_itvs[-1] = ProcSet()
+            nb_free[-1] = 0
+        return times, free_itvs, nb_free
+
+    def free_intervals(self, begin_time=0, end_time=None):
+        '''
+        :returns: a dataframe with the free resources over time. Each line
+            corespounding to an event in the jobset.
+        '''
+        times, free_itvs, _ = self._sweep_free_intervals(begin_time, end_time)
+        return pd.DataFrame({'time': times, 'free_itvs': free_itvs})
+
+    def free_slot_arrays(self, begin_time=0, end_time=None):
+        '''
+        Compute the not overlapping rectangle free slots of this JobSet
+        maximizing the time, see :py:meth:`free_slots`.
+
+        The open slots are kept as sorted disjoint resource intervals, with
+        the time they became free, and each event only updates the open
+        slots that intersect the allocation of its job.
+
+        :returns: a tuple of four aligned arrays ``(begin, end, inf, sup)``:
+            the free slot `i` is the resources from `inf[i]` to `sup[i]`
+            from the time `begin[i]` to `end[i]`. The slots are sorted by
+            end time, begin time and resources.
+        '''
+        times, event_grabs, event_jobs = self._sweep_events(begin_time,
+                                                            end_time)
+        offsets = self.alloc_offsets.tolist()
+        alloc_inf = self.alloc_inf.tolist()
+        alloc_sup = self.alloc_sup.tolist()
+
+        # open slots: sorted disjoint resource intervals with their begin
+        # time, all resources but the ones of the running jobs are free at
+        # the beginning
+        free = list(self._free_resources_at(begin_time).intervals())
+        infs = [itv.inf for itv in free]
+        sups = [itv.sup for itv in free]
+        begins = [times[0].item()] * len(infs)
+        slots = []
+        last = len(times) - 1
+        events = zip(times.tolist()[1:last], event_grabs.tolist(),
+                     event_jobs.tolist())
+        for time, grab, job in events:
+            job_itvs = zip(alloc_inf[offsets[job]:offsets[job + 1]],
+                           alloc_sup[offsets[job]:offsets[job + 1]])
+            for inf, sup in job_itvs:
+                lo = bisect.bisect_left(sups, inf)
+                hi = bisect.bisect_right(infs, sup)
+                new_slots = []
+                if grab:
+                    # the taken part of the open slots ends, the rest stays
+                    # open
+                    for k in range(lo, hi):
+                        slots.append((begins[k], time, max(infs[k], inf),
+                                      min(sups[k], sup)))
+                        if infs[k] < inf:
+                            new_slots.append((infs[k], inf - 1, begins[k]))
+                        if sups[k] > sup:
+                            new_slots.append((sup + 1, sups[k], begins[k]))
+                else:
+                    # the freed resources that are not already free begin
+                    # a new slot
+                    current = inf
+                    for k in range(lo, hi):
+                        if infs[k] > current:
+                            new_slots.append((current, infs[k] - 1, time))
+                        new_slots.append((infs[k], sups[k], begins[k]))
+                        current = sups[k] + 1
+                    if current <= sup:
+                        new_slots.append((current, sup, time))
+                infs[lo:hi] = [s[0] for s in new_slots]
+                sups[lo:hi] = [s[1] for s in new_slots]
+                begins[lo:hi] = [s[2] for s in new_slots]
+
+        if last > 0:
+            # all the open slots end with the last event
+            slots.extend(zip(begins, [times[last].item()] * len(begins),
+                             infs, sups))
+
+        slots = np.array(slots, dtype=object).reshape(-1, 4)
+        begin = slots[:, 0].astype(times.dtype)
+        end = slots[:, 1].astype(times.dtype)
+        inf = slots[:, 2].astype(np.int64)
+        sup = slots[:, 3].astype(np.int64)
+
+        # merge the contiguous parts of a slot
+        order = np.lexsort((inf, begin, end))
+        begin, end, inf, sup = (begin[order], end[order], inf[order],
+                                sup[order])
+        first = np.ones(len(inf), dtype=bool)
+        first[1:] = ((begin[1:] != begin[:-1]) | (end[1:] != end[:-1]) |
+                     (inf[1:] != sup[:-1] + 1))
+        closing = np.ones(len(inf), dtype=bool)
+        closing[:-1] = first[1:]
+        return begin[first], end[first], inf[first], sup[closing]
 
     def free_slots(self, begin_time=0, end_time=None):
         '''
         :returns: a DataFrame (compatible with a JobSet) that contains all
             the not overlapping square free slots of this JobSet maximzing the
             time. It can be transform to a JobSet to be plot as gantt chart.
+            The resources freed during the same period are grouped in one
+            slot. See :py:meth:`free_slot_arrays` to get the slots as
+            arrays.
         '''
-        # slots_time contains tuple of
-        # (slot_begin_time,free_resources_intervals)
-        free_interval_serie = self.free_intervals(begin_time, end_time)
-        slots_time = [(free_interval_serie.time[0], ProcSet(self.res_bounds))]
-        new_slots_time = slots_time
         columns = ['jobID', 'allocated_resources',
                    'starting_time', 'finish_time', 'execution_time',
                    'submission_time']
-        free_slots_df = pd.DataFrame(columns=columns)
-        prev_free_itvs = ProcSet(self.res_bounds)
-        slots = 0
-        for i, curr_row in free_interval_serie.iterrows():
-            if i == 0:
-                continue
-            new_slots_time = []
-            curr_time = curr_row.time
-            taken_resources = prev_free_itvs - curr_row.free_itvs
-            freed_resources = curr_row.free_itvs - prev_free_itvs
-            if i == len(free_interval_serie) - 1:
-                taken_resources = ProcSet(self.res_bounds)
-            if taken_resources:
-                # slot ends: store it and update free slot
-                for begin_time, itvs in slots_time:
-                    to_update = itvs & taken_resources
-                    if to_update:
-                        # store new slots
-                        slots = slots + 1
-                        new_slot = [str(slots),
-                                    to_update,
-                                    begin_time,
-                                    curr_time,
-                                    curr_time - begin_time,
-                                    begin_time]
-                        free_slots_df.loc[slots] = new_slot
-                        # remove free slots
-                        free_res = itvs - to_update
-                        if free_res:
-                            new_slots_time.append((begin_time, free_res))
-                    else:
-                        new_slots_time.append((begin_time, itvs))
-
-            if freed_resources:
-                # slots begin: udpate free slot
-                if not new_slots_time:
-                    new_slots_time = slots_time
-                new_slots_time.append((curr_time, freed_resources))
-
-            # update previous
-            prev_free_itvs = curr_row.free_itvs
-            # clean slots_free
-            slots_time = new_slots_time
-        return free_slots_df
+        begin, end, inf, sup = self.free_slot_arrays(begin_time, end_time)
+
+        # one slot by period
+        first = np.ones(len(begin), dtype=bool)
+        first[1:] = (begin[1:] != begin[:-1]) | (end[1:] != end[:-1])
+        starts = np.flatnonzero(first)
+        stops = np.append(starts[1:], len(begin))
+        itvs = list(zip(inf.tolist(), sup.tolist()))
+        allocated_resources = [ProcSet(*itvs[start:stop])
+                               for start, stop in zip(starts, stops)]
+
+        nb_slots = len(starts)
+        begin = begin[starts]
+        end = end[starts]
+        return pd.DataFrame({
+            'jobID': [str(slot) for slot in range(1, nb_slots + 1)],
+            'allocated_resources': allocated_resources,
+            'starting_time': begin,
+            'finish_time': end,
+            'execution_time': end - begin,
+            'submission_time': begin,
+        }, columns=columns, index=pd.RangeIndex(1, nb_slots + 1))
 
     def fragmentation(self,
                       p=2,
@@ -345,9 +848,9 @@ class JobSet(object):
                       begin_time=None,
                       end_time=None):
         if end_time is None:
-            end_time = self.df.finish_time.max()
+            end_time = self._df.finish_time.max()
         if begin_time is None:
-            begin_time = self.df.submission_time.min()
+            begin_time = self._df.submission_time.min()
         return fragmentation(
            self.free_resources_gaps(resource_intervals,
                                     begin_time, end_time),
@@ -360,28 +863,235 @@ class JobSet(object):
     def free_resources_gaps(self, resource_intervals=None,
                             begin_time=0, end_time=None):
         """
+        Compute the idle periods of each resource from `begin_time` to
+        `end_time` straight from the allocation arrays: the busy periods of
+        the jobs running in this period, clipped to it, are sorted by
+        resource and time then the gaps are the differences between them.
+
         :param resource_intervals: An interval set on which compute the
             free resources gaps, Default: self.res_bounds
         :returns: a resource indexed list where each element is a numpy
             array of free slots.
         """
-        js = self
-        fs = js.free_slots(begin_time, end_time)
-        free_resources_gaps = []
         if resource_intervals is None:
             resource_intervals = self.res_bounds
-        for _ in range(resource_intervals[0], resource_intervals[1] + 1):
-            free_resources_gaps.append([])
+        first_res, last_res = resource_intervals[0], resource_intervals[1]
+        nb_res = last_res - first_res + 1
+        if end_time is None:
+            # same end than the free slots
+            times, _, _ = self._sweep_events(begin_time, end_time)
+            end_time = times[-1]
+
+        # busy periods of the jobs running in the period, one by allocated
+        # interval
+        starting_time = self._df['starting_time'].values
+        finish_time = self._df['finish_time'].values
+        nb_itvs = np.diff(self.alloc_offsets)
+        itv_start = np.repeat(starting_time, nb_itvs)
+        itv_finish = np.repeat(finish_time, nb_itvs)
+        itv_inf = np.maximum(self.alloc_inf, first_res)
+        itv_sup = np.minimum(self.alloc_sup, last_res)
+        keep = ((itv_finish > begin_time) & (itv_start < end_time) &
+                (itv_inf <= itv_sup))
+        itv_start = np.maximum(itv_start[keep], begin_time)
+        itv_finish = np.minimum(itv_finish[keep], end_time)
+        itv_inf = itv_inf[keep]
+        itv_sup = itv_sup[keep]
+
+        # one busy period by resource
+        sizes = itv_sup - itv_inf + 1
+        itv_idx = np.repeat(np.arange(len(sizes)), sizes)
+        res = (itv_inf[itv_idx] - first_res +
+               np.arange(len(itv_idx)) - np.repeat(np.cumsum(sizes) - sizes,
+                                                   sizes))
+        start = itv_start[itv_idx]
+        finish = itv_finish[itv_idx]
+        order = np.lexsort((start, res))
+        res, start, finish = res[order], start[order], finish[order]
 
-        def get_free_slots_by_resources(x):
-            for res in range(resource_intervals[0], resource_intervals[1] + 1):
-                if res in x.allocated_resources:
-                    free_resources_gaps[res - resource_intervals[0]].append(x.execution_time)
+        # a gap before each busy period, from the previous one or from the
+        # beginning, and a gap after the last busy period of each resource
+        first = np.ones(len(res), dtype=bool)
+        first[1:] = res[1:] != res[:-1]
+        previous_end = np.empty(len(res), dtype=float)
+        previous_end[first] = begin_time
+        previous_end[~first] = finish[np.flatnonzero(~first) - 1]
+        lasts = np.ones(len(res), dtype=bool)
+        lasts[:-1] = first[1:]
+        lasts &= finish < end_time
 
-        # compute resource gaps
-        fs.apply(get_free_slots_by_resources, axis=1)
-        # format each gap list in numpy array
-        for i, fi in enumerate(free_resources_gaps):
-            free_resources_gaps[i] = np.asarray(fi)
+        # resources without busy period are free during the whole period
+        if end_time > begin_time:
+            idle = np.setdiff1d(np.arange(nb_res), res)
+        else:
+            idle = np.array([], dtype=np.int64)
+        gap_res = np.concatenate([res, res[lasts], idle])
+        gaps = np.concatenate([start - previous_end,
+                               end_time - finish[lasts],
+                               np.full(len(idle), end_time - begin_time,
+                                       dtype=float)])
+        gap_time = np.concatenate([start, finish[lasts],
+                                   np.full(len(idle), begin_time)])
+        order = np.lexsort((gap_time, gap_res))
+        gap_res, gaps = gap_res[order], gaps[order]
+
+        bounds = np.searchsorted(gap_res, np.arange(1, nb_res))
+        return np.split(gaps, bounds)
 
-        return free_resources_gaps
+    def _occupancy_edges(self, bin_width, begin_time=None, end_time=None):
+        if begin_time is None:
+            begin_time = self._df['starting_time'].min()
+        if end_time is None:
+            end_time = self._df['finish_time'].max()
+        nb_bins = max(1, int(np.ceil((end_time - begin_time) / bin_width)))
+        edges = begin_time + np.arange(nb_bins + 1) * float(bin_width)
+        edges[-1] = end_time
+        return edges
+
+    def _occupancy_block(self, first_res, last_res, edges, itvs):
+        '''
+        Busy fraction of the resources from `first_res` to `last_res` in
+        each bin given by the `edges` times, from the ``(start, finish, inf,
+        sup, weight)`` arrays of the allocated intervals clipped to the
+        period, with a row of weights by interval.
+
+        The whole bins covered by an interval are added in a 2D difference
+        array, the partially covered bins at both ends in a difference array
+        along the resources only, then both are cumulated. The result has a
+        last axis by weight.
+        '''
+        start, finish, inf, sup, weight = itvs
+        keep = (inf <= last_res) & (sup >= first_res)
+        start, finish, weight = start[keep], finish[keep], weight[keep]
+        row0 = np.maximum(inf[keep], first_res) - first_res
+        row1 = np.minimum(sup[keep], last_res) - first_res + 1
+
+        nb_rows = last_res - first_res + 1
+        nb_bins = len(edges) - 1
+        widths = np.diff(edges)
+        first_bin = np.searchsorted(edges, start, side='right') - 1
+        last_bin = np.searchsorted(edges, finish, side='left') - 1
+        same_bin = first_bin == last_bin
+        shape = (nb_rows + 1, nb_bins + 1)
+
+        def scatter(rows, cols, weights):
+            cells = rows * shape[1] + cols
+            busy = np.stack([
+                np.bincount(cells, weights=column,
+                            minlength=shape[0] * shape[1])
+                for column in weights.T], axis=-1)
+            return busy.astype(float, copy=False).reshape(
+                shape + (weights.shape[1],))
+
+        # whole bins, in number of bins
+        full = ~same_bin & (last_bin > first_bin + 1)
+        r0, r1 = row0[full], row1[full]
+        c0, c1 = first_bin[full] + 1, last_bin[full]
+        ones = weight[full]
+        whole = scatter(np.concatenate([r0, r0, r1, r1]),
+                        np.concatenate([c0, c1, c0, c1]),
+                        np.concatenate([ones, -ones, -ones, ones]))
+        busy = np.cumsum(whole, axis=1)
+        busy[:, :nb_bins] *= widths[:, np.newaxis]
+
+        # partial bins, in time
+        head = (np.where(same_bin, finish, edges[first_bin + 1]) -
+                start)[:, np.newaxis] * weight
+        r0, r1 = row0[~same_bin], row1[~same_bin]
+        tail = ((finish[~same_bin] -
+                 edges[last_bin[~same_bin]])[:, np.newaxis] *
+                weight[~same_bin])
+        busy += scatter(
+            np.concatenate([row0, row1, r0, r1]),
+            np.concatenate([first_bin, first_bin, last_bin[~same_bin],
+                            last_bin[~same_bin]]),
+            np.concatenate([head, -head, tail, -tail]))
+
+        np.cumsum(busy, axis=0, out=busy)
+        return (busy[:nb_rows, :nb_bins] /
+                widths[:, np.newaxis]).astype(np.float32)
+
+    def iter_occupancy_matrix(self, bin_width, begin_time=None,
+                              end_time=None,
+                              max_memory=OCCUPANCY_MAX_MEMORY,
+                              weights=None):
+        '''
+        Compute the occupancy matrix by chunks of resources, see
+        :py:meth:`occupancy_matrix`.
+
+        :param max_memory: the memory budget in bytes of the computation of
+            one chunk.
+        :param weights: if set, an array with a weight by job: the busy
+            time of each job is multiplied by its weight (e.g. to blend a
+            color by job). It can also be a 2D array with a row of weights
+            by job, to compute the occupancies of all the weights in a
+            single pass: the chunks then have a last axis by weight.
+
+        :returns: an iterator of ``(first_resource, chunk)`` where `chunk`
+            is the occupancy of the resources from `first_resource`.
+        '''
+        edges = self._occupancy_edges(bin_width, begin_time, end_time)
+        return self._iter_occupancy_blocks(edges, max_memory, weights)
+
+    def _iter_occupancy_blocks(self, edges, max_memory, weights=None):
+        df = self._df
+        begin_time, end_time = edges[0], edges[-1]
+        nb_bins = len(edges) - 1
+
+        # allocated intervals clipped to the period
+        nb_itvs = np.diff(self.alloc_offsets)
+        start = np.repeat(df['starting_time'].values, nb_itvs)
+        finish = np.repeat(df['finish_time'].values, nb_itvs)
+        start = np.maximum(start, begin_time)
+        finish = np.minimum(finish, end_time)
+        if weights is None:
+            weights = np.ones(len(df))
+        weights = np.asarray(weights, dtype=float)
+        stacked = weights.ndim == 2
+        weight = np.repeat(weights.reshape(len(df), -1), nb_itvs, axis=0)
+        keep = start < finish
+        itvs = (start[keep], finish[keep], self.alloc_inf[keep],
+                self.alloc_sup[keep], weight[keep])
+
+        # a few float64 working arrays and the float32 result by cell and
+        # by weight
+        row_size = 40 * (nb_bins + 1) * weight.shape[1]
+        chunk = max(1, int(max_memory // row_size))
+        first_res, last_res = self.res_bounds.inf, self.res_bounds.sup
+        for lo in range(first_res, last_res + 1, chunk):
+            hi = min(lo + chunk - 1, last_res)
+            block = self._occupancy_block(lo, hi, edges, itvs)
+            yield lo, block if stacked else block[..., 0]
+
+    def occupancy_matrix(self, bin_width, begin_time=None, end_time=None,
+                         max_memory=OCCUPANCY_MAX_MEMORY):
+        '''
+        Rasterize the job allocations into a matrix of the busy fraction of
+        each resource in each bin of `bin_width` time from `begin_time`
+        (default: first starting time) to `end_time` (default: last finish
+        time). The last bin may be shorter.
+
+        :param max_memory: memory budget in bytes. If the dense matrix
+            would not fit, a `ValueError` is raised: use
+            :py:meth:`iter_occupancy_matrix` to compute it by chunks of
+            resources instead.
+
+        :returns: a float32 array of shape ``(resources, bins)``, the first
+            row being the resource ``res_bounds.inf``.
+
+        For example:
+
+        >>> from evalys.jobset import JobSet
+        >>> js = JobSet.from_csv("./examples/jobs.csv")
+        >>> occupancy = js.occupancy_matrix(bin_width=60)
+        '''
+        edges = self._occupancy_edges(bin_width, begin_time, end_time)
+        size = 4 * len(self.res_bounds) * (len(edges) - 1)
+        if size > max_memory:
+            raise ValueError(
+                "The occupancy matrix needs {} bytes, more than the memory "
+                "budget of {} bytes: use iter_occupancy_matrix to compute it "
+                "by chunks of resources".format(size, max_memory))
+        return np.concatenate([
+            chunk for _, chunk in self._iter_occupancy_blocks(edges,
+                                                              max_memory)])
@@ -1,5 +1,9 @@
+import numpy as np
 import pandas as pd
-from math import sqrt
+
+# delay after the maximum finish time of the events of still running jobs,
+# in seconds
+POSTPONE_DELAY = 1000
 
 
 def cumulative_waiting_time(dataframe):
@@ -22,110 +26,316 @@ def cumulative_waiting_time(dataframe):
     return wt_cumsum
 
 
+def _job_events(dataframe, col_begin, col_end, col_cumsum):
+    """
+    Build the start and stop events of the jobs from the needed columns
+    only, without copying the dataframe.
+
+    The `starting_time` and `finish_time` columns are computed from the
+    submission, waiting and execution times. The events of still running
+    jobs (execution time = -1) on these columns are not part of the
+    returned events because they happen at the end of the trace.
+
+    :returns: a tuple ``(times, deltas, deferred, has_deferred,
+        max_finish)`` with the unsorted events, the sum of the deltas of
+        the postponed events, if there are such events, and the maximum
+        finish time.
+    """
+    submission = dataframe['submission_time'].values
+    starting_time = submission + dataframe['waiting_time'].values
+    execution = dataframe['execution_time'].values
+    finish_time = starting_time + execution
+    computed = {'starting_time': starting_time,
+                'finish_time': finish_time}
+    max_finish = np.nanmax(finish_time) if len(finish_time) else None
+
+    # Cleaning:
+    # - still running jobs (runtime = -1)
+    # - not scheduled jobs (wait = -1)
+    # - no procs allocated (proc_alloc = -1)
+    if 'proc_alloc' in dataframe:
+        keep = dataframe['proc_alloc'].values > 0
+    else:
+        keep = np.ones(len(dataframe), dtype=bool)
+    unfinished = (execution == -1)[keep]
+    amount = dataframe[col_cumsum].values[keep]
+
+    times, deltas = [], []
+    deferred = 0
+    has_deferred = False
+    # starts add procs, stops remove procs
+    for col, sign in ((col_begin, 1), (col_end, -1)):
+        if col in computed:
+            values = computed[col][keep]
+            postponed = unfinished
+        else:
+            values = dataframe[col].values[keep]
+            postponed = np.zeros(len(values), dtype=bool)
+        deferred += sign * amount[postponed].sum()
+        has_deferred |= bool(postponed.any())
+        times.append(values[~postponed])
+        deltas.append(sign * amount[~postponed])
+    times = np.concatenate(times)
+    deltas = np.concatenate(deltas)
+    if times.dtype.kind == 'f':
+        valid = ~np.isnan(times)
+        times, deltas = times[valid], deltas[valid]
+    return times, deltas, deferred, has_deferred, max_finish
+
+
+def _reduce_events(times, deltas):
+    """
+    Sort events by time and sum the deltas of the events that happen at the
+    same time.
+
+    :returns: the sorted unique times and the summed deltas.
+    """
+    if len(times) == 0:
+        return times, deltas
+    order = np.argsort(times, kind='stable')
+    times = times[order]
+    deltas = deltas[order]
+    starts = np.flatnonzero(np.r_[True, times[1:] != times[:-1]])
+    return times[starts], np.add.reduceat(deltas, starts)
+
+
+def _merge_events(times, deltas, other_times, other_deltas):
+    """
+    Merge two sets of reduced events, as given by :py:func:`_reduce_events`,
+    in linear time: the events of the second set are either added to the
+    event of the first set at the same time or inserted at their sorted
+    position.
+
+    :returns: the sorted unique times and the summed deltas.
+    """
+    times = times.astype(np.result_type(times, other_times), copy=False)
+    deltas = deltas.astype(np.result_type(deltas, other_deltas))
+    positions = np.searchsorted(times, other_times)
+    same = np.zeros(len(other_times), dtype=bool)
+    inside = positions < len(times)
+    same[inside] = times[positions[inside]] == other_times[inside]
+    # the times of each set are unique so the positions of the same times
+    # are unique too
+    deltas[positions[same]] += other_deltas[same]
+    return (np.insert(times, positions[~same], other_times[~same]),
+            np.insert(deltas, positions[~same], other_deltas[~same]))
+
+
+def _load_from_events(times, deltas, deferred=0, has_deferred=False,
+                      max_finish=None, postpone_delay=POSTPONE_DELAY):
+    """
+    Cumulate the reduced events, with the postponed events put
+    `postpone_delay` after the maximum finish time.
+
+    :returns: the ``(times, load, area)`` arrays, the last area is NaN.
+    """
+    if has_deferred:
+        times, deltas = _reduce_events(
+            np.append(times, max_finish + postpone_delay),
+            np.append(deltas, deferred).astype(deltas.dtype))
+    load = np.cumsum(deltas)
+    area = np.full(len(load), np.nan)
+    area[:-1] = np.diff(times) * load[:-1]
+    return times, load, area
+
+
+def _load_frame(times, load, area):
+    return pd.DataFrame({'load': load, 'area': area},
+                        index=pd.Index(times, name='time'),
+                        columns=['load', 'area'])
+
+
+def compute_load_arrays(dataframe, col_begin, col_end, col_cumsum,
+                        postpone_delay=POSTPONE_DELAY):
+    """
+    NumPy kernel of :py:func:`compute_load`: only the needed columns of the
+    dataframe are read and the events happening at the same time are merged
+    with a sort and ``np.add.reduceat``.
+
+    :returns: a tuple of arrays ``(times, load, area)``
+    """
+    times, deltas, deferred, has_deferred, max_finish = _job_events(
+        dataframe, col_begin, col_end, col_cumsum)
+    times, deltas = _reduce_events(times, deltas)
+    return _load_from_events(times, deltas, deferred, has_deferred,
+                             max_finish, postpone_delay)
+
+
 def compute_load(dataframe, col_begin, col_end, col_cumsum,
-                 begin_time=0, end_time=None):
+                 begin_time=0, end_time=None, postpone_delay=POSTPONE_DELAY):
     """
     Compute the load of the `col_cumsum` columns between events from
     `col_begin` to `col_end`. In practice it is used to compute the queue
     load and the cluster load (utilisation).
 
+    :param postpone_delay: the events of the still running jobs are put
+        this time after the maximum finish time.
     :returns: a load dataframe of all events indexed by time with a `load`
         and an `area` column.
     """
-    # Avoid side effect
-    df = pd.DataFrame.copy(dataframe)
-    df['starting_time'] = df['submission_time'] + df['waiting_time']
-    df['finish_time'] = df['starting_time'] + df['execution_time']
+    return _load_frame(*compute_load_arrays(dataframe, col_begin, col_end,
+                                            col_cumsum, postpone_delay))
 
-    df = df.sort_values(by=col_begin)
 
-    # Cleaning:
-    # - still running jobs (runtime = -1)
-    # - not scheduled jobs (wait = -1)
-    # - no procs allocated (proc_alloc = -1)
-    max_time = df['finish_time'].max() + 1000
-    df.loc[df['execution_time'] == -1, 'finish_time'] = max_time
-    df.loc[df['execution_time'] == -1, 'starting_time'] = max_time
-    if 'proc_alloc' in df:
-        df = df[df['proc_alloc'] > 0]
-
-    # Create a list of start and stop event associated to the number of
-    # proc allocation changes: starts add procs, stop remove procs
-    event_columns = ['time', col_cumsum, 'jobID']
-    start_event_df = pd.concat([df[col_begin],
-                                df[col_cumsum],
-                                df['jobID']],
-                               axis=1)
-    start_event_df.columns = event_columns
-    # Stop event give negative proc_alloc value
-    stop_event_df = pd.concat([df[col_end],
-                               - df[col_cumsum],
-                               df['jobID']],
-                              axis=1)
-    stop_event_df.columns = event_columns
-
-    # merge events and sort them
-    event_df = pd.concat([start_event_df, stop_event_df],
-        ignore_index=True).sort_values(by='time').reset_index(drop=True)
-
-    # sum the event that happend at the same time and cummulate events
-    load_df = pd.DataFrame(
-        event_df.groupby(event_df['time'])[col_cumsum].sum().cumsum(),
-        columns=[col_cumsum])
-    load_df["time"] = load_df.index
-
-    # compute area
-    load_df["area"] = - load_df["time"].diff(-1) * load_df[col_cumsum]
-    del load_df["time"]
-
-    load_df.columns = ["load", "area"]
-
-    return load_df
-
-
-def _load_insert_element_if_necessary(load_df, at):
-    """
-    Insert an event at the specified point that conserve data consistency
-    for "area" and "load" values
-    """
-    if len(load_df[load_df.time == at]) == 0:
-        prev_el = load_df[load_df.time <= at].tail(1)
-        new_el = prev_el.copy()
-        next_el = load_df[load_df.time >= at].head(1)
-        new_el.time = at
-        new_el.area = float(new_el.load) * float(next_el.time - at)
-        load_df.loc[prev_el.index, "area"] = \
-            float(prev_el.load) * float(at - prev_el.time)
-        load_df.loc[len(load_df)] = [
-            float(new_el.time),
-            float(new_el.load),
-            float(new_el.area)]
-        load_df = load_df.sort_values(by=["time"])
-    return load_df
+class LoadAccumulator(object):
+    """
+    Streaming variant of :py:func:`compute_load`: chunks of jobs are folded
+    into a running set of events so the load can be computed without
+    loading all the jobs at once. Only the reduced events are kept in
+    memory.
+
+    Example with :py:meth:`evalys.jobset.JobSet.iter_csv`:
+
+    >>> from evalys.jobset import JobSet
+    >>> utilisation = LoadAccumulator('starting_time', 'finish_time',
+    ...                               'proc_alloc')
+    >>> for js in JobSet.iter_csv("./examples/jobs.csv", chunksize=100):
+    ...     utilisation.add(js.df)
+    >>> load_df = utilisation.load
+    """
+    def __init__(self, col_begin, col_end, col_cumsum):
+        self.col_begin = col_begin
+        self.col_end = col_end
+        self.col_cumsum = col_cumsum
+        self._times = None
+        self._deltas = None
+        # events of still running jobs are postponed at the end of the
+        # trace, which is only known when all the chunks are folded
+        self._max_finish = None
+        self._deferred = 0
+        self._has_deferred = False
+
+    def add(self, dataframe):
+        """
+        Fold a chunk of jobs into the accumulator.
+        """
+        times, deltas, deferred, has_deferred, max_finish = _job_events(
+            dataframe, self.col_begin, self.col_end, self.col_cumsum)
+        if max_finish is not None and (self._max_finish is None or
+                                       max_finish > self._max_finish):
+            self._max_finish = max_finish
+        self._deferred += deferred
+        self._has_deferred |= has_deferred
+        # only the chunk is sorted, then it is merged into the reduced
+        # events of the previous chunks
+        times, deltas = _reduce_events(times, deltas)
+        if self._times is not None:
+            times, deltas = _merge_events(self._times, self._deltas,
+                                          times, deltas)
+        self._times, self._deltas = times, deltas
+
+    @property
+    def load(self):
+        """
+        :returns: a load dataframe of all events indexed by time with a
+            `load` and an `area` column, like :py:func:`compute_load`.
+        """
+        if self._times is None:
+            return pd.DataFrame({'load': [], 'area': []},
+                                index=pd.Index([], name='time'))
+        return _load_frame(*_load_from_events(
+            self._times, self._deltas, self._deferred, self._has_deferred,
+            self._max_finish))
+
+
+class MeanAccumulator(object):
+    """
+    Streaming mean of a column over chunks of jobs, e.g. the mean waiting
+    time.
+    """
+    def __init__(self, column):
+        self.column = column
+        self.total = 0
+        self.count = 0
+
+    def add(self, dataframe):
+        """
+        Fold a chunk of jobs into the accumulator.
+        """
+        values = dataframe[self.column].dropna()
+        self.total += values.sum()
+        self.count += len(values)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else float('nan')
+
+
+class LoadIndex(object):
+    """
+    Index on a load dataframe, as given by :py:func:`compute_load`, to
+    compute the mean load over time windows with a binary search instead of
+    a scan of the whole dataframe.
+
+    It stores the sorted event times and the cumulative area under the load
+    at each event. The area up to any time is then found with
+    `searchsorted`, so the mean load over a window costs O(log n) and the
+    means over many windows are computed in one vectorized call:
+
+    >>> from evalys.jobset import JobSet
+    >>> js = JobSet.from_csv("./examples/jobs.csv")
+    >>> index = LoadIndex(js.utilisation)
+    >>> index.mean(begin=[0, 1000], end=[1000, 2000])
+    """
+    def __init__(self, load_df):
+        self.times = np.asarray(load_df.index.values, dtype=float)
+        self.load = np.asarray(load_df['load'].values, dtype=float)
+        self.cumulative_area = np.zeros(len(self.times))
+        np.cumsum(np.diff(self.times) * self.load[:-1],
+                  out=self.cumulative_area[1:])
+
+    def area(self, at):
+        """
+        :returns: the area under the load from the first event to `at`,
+            `at` can be a scalar or an array of times.
+        """
+        at = np.asarray(at, dtype=float)
+        prev = np.searchsorted(self.times, at, side='right') - 1
+        prev = np.clip(prev, 0, len(self.times) - 1)
+        return (self.cumulative_area[prev] +
+                (at - self.times[prev]) * self.load[prev])
+
+    def mean(self, begin=None, end=None):
+        """
+        Compute the mean load from `begin` to `end`. Both can be scalars or
+        arrays of the same shape to get the mean load of many windows at
+        once. By default the whole load range is used.
+        """
+        max_to = self.times[-1]
+        if end is None:
+            end = max_to
+        elif np.any(np.asarray(end) > max_to):
+            raise ValueError("computing mean load after the "
+                             "last event ({}) is NOT IMPLEMENTED".format(max_to))
+        min_to = self.times[0]
+        if begin is None:
+            begin = min_to
+        elif np.any(np.asarray(begin) < min_to):
+            raise ValueError("computing mean load befor the "
+                             "first event ({}) is NOT IMPLEMENTED".format(min_to))
+
+        begin = np.asarray(begin, dtype=float)
+        end = np.asarray(end, dtype=float)
+        return (self.area(end) - self.area(begin)) / (end - begin)
 
 
 def load_mean(df, begin=None, end=None):
     """ Compute the mean load area from begin to end. """
-    load_df = df.reset_index()
-    max_to = max(load_df.time)
-    if end is None:
-        end = max_to
-    elif end > max_to:
-        raise ValueError("computing mean load after the "
-                         "last event ({}) is NOT IMPLEMENTED".format(max_to))
-    min_to = load_df.time.iloc[0]
-    if begin is None:
-        begin = min_to
-    elif begin < min_to:
-        raise ValueError("computing mean load befor the "
-                         "first event ({}) is NOT IMPLEMENTED".format(min_to))
+    return LoadIndex(df).mean(begin=begin, end=end)
 
-    load_df = _load_insert_element_if_necessary(load_df, begin)
-    load_df = _load_insert_element_if_necessary(load_df, end)
 
-    u = load_df[(load_df.time < end) & (begin <= load_df.time)]
-
-    return u.area.sum()/(end - begin)
+def _gaps_sums(free_resources_gaps, p):
+    """
+    :returns: the number of gaps, the sum of the gaps and the sum of the
+        gaps to the power `p` of each resource.
+    """
+    f = free_resources_gaps
+    sizes = np.array([len(fi) for fi in f], dtype=np.int64)
+    res = np.repeat(np.arange(len(f)), sizes)
+    gaps = np.concatenate(f).astype(float) if len(f) else np.array([])
+    sums = np.bincount(res, weights=gaps, minlength=len(f))
+    sums_p = np.bincount(res, weights=gaps ** p, minlength=len(f))
+    return sizes, sums, sums_p
 
 
 def fragmentation(free_resources_gaps, p=2):
@@ -134,25 +344,20 @@ def fragmentation(free_resources_gaps, p=2):
     array of free slots.
 
     This metrics definition comes from Gher and Shneider CCGRID 2009.
+
+    :returns: a resource indexed Series of the fragmentation
     """
-    f = free_resources_gaps
-    frag = pd.Series()
-    for i, fi in enumerate(f):
-        if fi.size == 0:
-            frag_i = 0
-        else:
-            frag_i = 1 - (sum(fi**p) / sum(fi)**p)
-        frag.set_value(i, frag_i)
-    return frag
+    sizes, sums, sums_p = _gaps_sums(free_resources_gaps, p)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frag = np.where(sizes == 0, 0, 1 - (sums_p / sums ** p))
+    return pd.Series(frag)
 
 
 def fragmentation_reis(free_resources_gaps, time, p=2):
-    f = free_resources_gaps
-    frag = pd.Series()
-    for i, fi in enumerate(f):
-        if fi.size == 0:
-            frag_i = 0
-        else:
-            frag_i = 1 - (sqrt(sum(fi**p)) / time * len(f))
-        frag.set_value(i, frag_i)
-    return frag
+    """
+    :returns: a resource indexed Series of the fragmentation
+    """
+    sizes, _, sums_p = _gaps_sums(free_resources_gaps, p)
+    frag = np.where(sizes == 0, 0,
+                    1 - (np.sqrt(sums_p) / time * len(free_resources_gaps)))
+    return pd.Series(frag)
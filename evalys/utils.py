@@ -1,4 +1,78 @@
 # -*- coding: utf-8 -*-
+import bz2
+import gzip
+import io
+import lzma
+import os
+
+import numpy as np
+
+from evalys.intervals import IntervalTree
+
+
+COMPRESSION_EXTENSIONS = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+    '.zst': 'zstd',
+}
+
+
+def split_compression_extension(filename):
+    """
+    Split the compression extension from a trace file name.
+
+    >>> split_compression_extension("trace.swf.gz")
+    ('trace.swf', 'gzip')
+    >>> split_compression_extension("trace.swf")
+    ('trace.swf', None)
+
+    :returns: the file name without its compression extension and the
+        compression (one of the values of `COMPRESSION_EXTENSIONS` or
+        ``None``).
+    """
+    base, extension = os.path.splitext(filename)
+    compression = COMPRESSION_EXTENSIONS.get(extension.lower())
+    if compression is None:
+        return filename, None
+    return base, compression
+
+
+def open_trace(filename, mode='rb', compression='infer'):
+    """
+    Open a trace file and decompress (or compress) it on the fly.
+
+    :param mode: the opening mode, as for the builtin :py:func:`open`.
+    :param compression: ``'infer'`` to detect the compression from the file
+        extension (see `COMPRESSION_EXTENSIONS`), ``None`` for no
+        compression, or one of ``'gzip'``, ``'bz2'``, ``'xz'`` and
+        ``'zstd'``. The ``'zstd'`` compression needs the `zstandard`
+        package.
+    :returns: a file object. Binary readers support `peek`.
+    """
+    if compression == 'infer':
+        _, compression = split_compression_extension(filename)
+
+    if compression is None:
+        return open(filename, mode)
+    if compression == 'gzip':
+        return gzip.open(filename, mode)
+    if compression == 'bz2':
+        return bz2.open(filename, mode)
+    if compression == 'xz':
+        return lzma.open(filename, mode)
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("The zstandard package is needed to handle "
+                              "zstd compressed traces: {}".format(filename))
+        trace = zstandard.open(filename, mode)
+        if mode == 'rb':
+            trace = io.BufferedReader(trace)
+        return trace
+    raise ValueError("Unknown compression: {}".format(compression))
+
 
 def bulksetattr(obj, **kwargs):
     """
@@ -15,6 +89,68 @@ def bulksetattr(obj, **kwargs):
         setattr(obj, attr, kwargs[attr])  # attr is valid, update its value
 
 
+def cut_workload_many(workload_df, begins, ends):
+    """
+    Batched :py:func:`cut_workload`: find the jobs of many periods at once.
+    The jobs are sorted once by submission time and the boundaries of all
+    the periods are found with vectorized binary searches. The queued and
+    running jobs at the beginning of each period are found with interval
+    trees (see :py:class:`evalys.intervals.IntervalTree`).
+
+    :returns: a list with a dict by period, with the keys "workload",
+        "queue" and "running" like :py:func:`cut_workload`, of the row
+        positions of the jobs in `workload_df` sorted by jobID. Use
+        ``workload_df.iloc[positions]`` to get the jobs.
+
+    For example:
+
+    >>> from evalys.workload import Workload
+    >>> w = Workload.from_csv("./examples/UniLu-Gaia-2014-2.swf")
+    >>> cuts = cut_workload_many(w.df, [200000, 400000], [400000, 600000])
+    >>> queued = w.df.iloc[cuts[1]["queue"]]
+    """
+    begins = np.asarray(begins)
+    ends = np.asarray(ends)
+    assert (begins < ends).all()
+
+    submission_time = workload_df['submission_time'].values
+    starting_time = submission_time + workload_df['waiting_time'].values
+    finish_time = starting_time + workload_df['execution_time'].values
+
+    # jobs that are submitted in the periods
+    by_submission = np.argsort(submission_time, kind='stable')
+    sorted_submission = submission_time[by_submission]
+    firsts = np.searchsorted(sorted_submission, begins)
+    lasts = np.searchsorted(sorted_submission, ends)
+
+    queued_index = IntervalTree(submission_time, starting_time)
+    running_index = IntervalTree(starting_time, finish_time)
+
+    # rank of each job by jobID to sort the jobs of each period
+    jobid_rank = np.empty(len(workload_df), dtype=np.int64)
+    jobid_rank[np.argsort(workload_df['jobID'].values, kind='stable')] = \
+        np.arange(len(workload_df))
+
+    def by_jobid(positions):
+        return positions[np.argsort(jobid_rank[positions], kind='stable')]
+
+    cuts = []
+    for begin, first, last in zip(begins, firsts, lasts):
+        # queued: submission before the period begin and start in the
+        # period
+        queued = queued_index.at(begin)
+        queued = queued[submission_time[queued] < begin]
+        # running: start before the period begin and stop after it
+        running = running_index.at(begin)
+        running = running[(starting_time[running] < begin) &
+                          (finish_time[running] > begin)]
+        cuts.append({
+            "workload": by_jobid(by_submission[first:last]),
+            "queue": by_jobid(queued),
+            "running": by_jobid(running)})
+    return cuts
+
+
 def cut_workload(workload_df, begin_time, end_time):
     """
     Extract any workload dataframe between begin_time and end_time.
@@ -25,6 +161,8 @@ def cut_workload(workload_df, begin_time, end_time):
     and jobs that are running before `begin_time` and/or after `end_time`
     are cut to fit in this time slice.
 
+    To cut many periods, use :py:func:`cut_workload_many`.
+
     Example with :py:class:`evalys.Workload`:
 
     >>> from evalys.workload import Workload
@@ -38,40 +176,6 @@ def cut_workload(workload_df, begin_time, end_time):
     >>> cut_js = cut_workload(js.df, 1000, 2000)
 
     """
-    assert begin_time < end_time
-
-    # reindex workload by start time to extract easily
-    df = workload_df.copy()
-
-    contains_starting_time = 'starting_time' in df
-
-    df['starting_time'] = df['submission_time'] + df['waiting_time']
-    df = df.sort_values(by='submission_time').set_index(['submission_time'],
-                                                        drop=False)
-
-    # find closest index
-    begin = df.index.searchsorted(begin_time)
-    end = df.index.searchsorted(end_time)
-
-    # Extract jobs that start in the period
-    to_export = df.iloc[begin:end]
-
-    # Get job in queue (submission before period begin and start in the period)
-    queued_jobs = df[(df["submission_time"] < begin_time)
-                     & (df["starting_time"] >= begin_time)]
-
-    # Get running jobs (start before and stop during or after the period)
-    running_jobs = df[
-        (df["starting_time"] < begin_time) &
-        (df["starting_time"] + df["execution_time"] > begin_time)]
-
-    # return dataframe sorted without starting_time column and a proper index
-    if not contains_starting_time:
-        to_export.drop('starting_time', inplace=True, axis=1)
-        queued_jobs.drop('starting_time', inplace=True, axis=1)
-        running_jobs.drop('starting_time', inplace=True, axis=1)
-
-    return {
-        "workload": to_export.sort_values(by="jobID").reset_index(drop=True),
-        "queue": queued_jobs.sort_values(by="jobID").reset_index(drop=True),
-        "running": running_jobs.sort_values(by="jobID").reset_index(drop=True)}
+    cut = cut_workload_many(workload_df, [begin_time], [end_time])[0]
+    return {key: workload_df.iloc[positions].reset_index(drop=True)
+            for key, positions in cut.items()}
@@ -4,4 +4,5 @@ from .core import generate_palette, COLORBLIND_FRIENDLY_PALETTE
 from .details import plot_details
 from .gantt import plot_gantt, plot_diff_gantt
 from .lifecycle import plot_lifecycle
+from .occupancy import plot_occupancy
 from .series import plot_series
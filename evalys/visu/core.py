@@ -2,8 +2,12 @@
 
 import collections
 
+import matplotlib.artist
+import matplotlib.dates
+import matplotlib.font_manager
 import matplotlib.pyplot
 import numpy
+import pandas
 
 
 def generate_palette(size):
@@ -13,6 +17,175 @@ def generate_palette(size):
     return list(matplotlib.pyplot.cm.viridis(numpy.linspace(0, 1, size)))
 
 
+def epoch_to_datenum(seconds, offset=0, tz=None):
+    """
+    Convert timestamps in seconds from `offset` (a Unix time, such as the
+    `UnixStartTime` of a workload) to matplotlib date numbers, by arithmetic
+    on float arrays.
+
+    If a time zone `tz` is given, the date numbers are the wall clock times
+    in this time zone instead of UTC.
+    """
+    seconds = numpy.asarray(seconds, dtype=float) + offset
+    if tz is not None:
+        utc = pandas.to_datetime(seconds.ravel(), unit='s', utc=True)
+        local = utc.tz_convert(tz).tz_localize(None)
+        shift = (local - utc.tz_localize(None)).total_seconds()
+        seconds = seconds + numpy.reshape(shift, seconds.shape)
+    epoch = matplotlib.dates.date2num(numpy.datetime64(0, 's'))
+    return epoch + seconds / 86400
+
+
+def datenum_to_epoch(datenums, offset=0):
+    """
+    Convert matplotlib date numbers back to timestamps in seconds from
+    `offset`, see `epoch_to_datenum`.
+    """
+    epoch = matplotlib.dates.date2num(numpy.datetime64(0, 's'))
+    return (numpy.asarray(datenums, dtype=float) - epoch) * 86400 - offset
+
+
+def job_intervals(jobset, positions=None):
+    """
+    Return the allocated intervals of the jobs of `jobset` as flat arrays
+    ``(jobs, inf, sup)``, where `jobs` is the position of the job of each
+    interval.
+
+    If the `positions` of some jobs are given, only their intervals are
+    returned and `jobs` is the index of the job in `positions`.
+    """
+    offsets = jobset.alloc_offsets
+    if positions is None:
+        jobs = numpy.repeat(numpy.arange(len(offsets) - 1), numpy.diff(offsets))
+        return jobs, jobset.alloc_inf, jobset.alloc_sup
+    positions = numpy.asarray(positions, dtype=numpy.int64)
+    counts = offsets[positions + 1] - offsets[positions]
+    jobs = numpy.repeat(numpy.arange(len(positions)), counts)
+    # index of the intervals: the offset of their job plus their rank
+    firsts = numpy.cumsum(counts) - counts
+    itvs = offsets[positions][jobs] + numpy.arange(len(jobs)) - firsts[jobs]
+    return jobs, jobset.alloc_inf[itvs], jobset.alloc_sup[itvs]
+
+
+def rectangles(x, y, width, height):
+    """
+    Return the vertices of many rectangles as an array of shape ``(n, 4, 2)``
+    to build a single `PolyCollection`.
+    """
+    x, y, width, height = numpy.broadcast_arrays(
+        *(numpy.asarray(a, dtype=float) for a in (x, y, width, height)))
+    verts = numpy.empty((len(x), 4, 2))
+    verts[:, 0, 0] = verts[:, 1, 0] = x
+    verts[:, 2, 0] = verts[:, 3, 0] = x + width
+    verts[:, 0, 1] = verts[:, 3, 1] = y
+    verts[:, 1, 1] = verts[:, 2, 1] = y + height
+    return verts
+
+
+def fitting_labels(ax, x, y, width, height, labels, fontsize='small'):
+    """
+    Tell which `labels` fit in their rectangle once drawn on `ax`, given the
+    current data-to-pixel transform of the axe.  The size of the rendered
+    text is estimated from the font size and the number of characters.
+
+    :returns: a boolean array, `True` for the labels that fit.
+    """
+    size = (matplotlib.font_manager.FontProperties(size=fontsize)
+            .get_size_in_points() * ax.figure.dpi / 72)
+    x, y, width, height = numpy.broadcast_arrays(
+        *(numpy.asarray(a, dtype=float) for a in (x, y, width, height)))
+    corners = ax.transData.transform(numpy.column_stack([x, y]))
+    opposites = ax.transData.transform(
+        numpy.column_stack([x + width, y + height]))
+    pixels = numpy.abs(opposites - corners)
+    lengths = numpy.array([len(str(label)) for label in labels])
+    # the average width of a character is about 0.6 em
+    return (pixels[:, 0] >= 0.6 * size * lengths) & (pixels[:, 1] >= size)
+
+
+def gantt_raster(jobset, colors, alpha, begin_time, end_time, width):
+    """
+    Paint the allocations of `jobset` from `begin_time` to `end_time` into an
+    RGBA image with `width` time columns and a row per resource.
+
+    The color of each pixel is the mean of the `colors` of the jobs (an RGBA
+    array by job) weighted by their busy time in the pixel, and its opacity
+    is `alpha` times the busy fraction, so that it looks like the
+    transparent rectangles of a vector Gantt chart.
+    """
+    bin_width = (end_time - begin_time) / width or 1
+
+    # the busy time and the RGB channels weighted by the busy time, in a
+    # single pass over the allocations
+    weights = numpy.column_stack([numpy.ones(len(colors)), colors[:, :3]])
+    occupancy = numpy.concatenate([
+        chunk for _, chunk in jobset.iter_occupancy_matrix(
+            bin_width, begin_time, end_time, weights=weights)
+    ])
+    busy = occupancy[..., 0]
+    image = numpy.zeros(busy.shape + (4,), dtype=numpy.float32)
+    used = busy > 0
+    image[used, :3] = occupancy[used, 1:] / busy[used, numpy.newaxis]
+    image[..., 3] = numpy.minimum(alpha * busy, 1)
+    return numpy.clip(image, 0, 1)
+
+
+class DrawHook(matplotlib.artist.Artist):
+    """
+    Invisible artist of a figure calling `callback` each time the figure is
+    drawn, before its axes are drawn, so that their content can be adapted
+    to their final limits and size.
+    """
+
+    def __init__(self, callback):
+        super().__init__()
+        self._callback = callback
+        self.set_zorder(-1)  # before the axes
+        self.set_in_layout(False)
+
+    def draw(self, renderer):
+        self._callback()
+
+
+def decimate_steps(x, y, nb_columns):
+    """
+    Reduce a `steps-post` series of sorted `x` to at most three points per
+    column when its x range is split in `nb_columns` columns: the minimum
+    and the maximum values at the first event of the column, and the last
+    value at its last event.  The peaks and the idle periods stay visible
+    exactly at the resolution of the columns.
+
+    :returns: the decimated ``(x, y)`` arrays, or the given ones if they
+        are already small enough.
+    """
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    if len(x) <= 3 * nb_columns:
+        return x, y
+    span = (x[-1] - x[0]) or 1
+    columns = numpy.minimum(((x - x[0]) / span * nb_columns).astype(int),
+                            nb_columns - 1)
+    starts = numpy.flatnonzero(numpy.diff(columns, prepend=-1))
+    stops = numpy.append(starts[1:], len(x)) - 1
+    xs = numpy.column_stack([x[starts], x[starts], x[stops]]).ravel()
+    ys = numpy.column_stack([
+        numpy.minimum.reduceat(y, starts),
+        numpy.maximum.reduceat(y, starts),
+        y[stops],
+    ]).ravel()
+    return xs, ys
+
+
+# Gantt charts of more jobs than this are painted as images by default
+GANTT_RASTER_THRESHOLD = 20000
+
+# Job details of more jobs than this are plotted as densities by default
+JOB_DETAILS_DENSITY_THRESHOLD = 50000
+
+# Loads of more events than this are decimated by default
+LOAD_DECIMATION_THRESHOLD = 100000
+
+
 # pylint: disable=bad-whitespace
 COLORBLIND_FRIENDLY_PALETTE = (
     # http://jfly.iam.u-tokyo.ac.jp/color/#pallet
@@ -28,6 +201,84 @@ COLORBLIND_FRIENDLY_PALETTE = (
 # pylint: enable=bad-whitespace
 
 
+class PreparedJobSet:
+    """
+    Columns and derived arrays of a jobset, computed once and shared by all
+    the visualizations built from it, such as the visualizations of a
+    `DetailsLayout`.
+
+    Besides the columns of the jobset, the `'jobsize'` column is the number
+    of allocated resources of each job.  With the `'time'` x-axis scale, the
+    time columns are converted to matplotlib date numbers.
+
+    :ivar jobset: The jobset under study, with its times in seconds (see
+        `JobSet.in_seconds`).
+    :vartype jobset: `JobSet`
+    """
+
+    TIME_COLUMNS = ('submission_time', 'starting_time', 'finish_time')
+
+    def __init__(self, jobset):
+        self.jobset = jobset.in_seconds()
+        self._columns = {}
+        self._load_times = {}
+
+    @classmethod
+    def of(cls, jobset):
+        """
+        Return `jobset` if it is already prepared, or a new `PreparedJobSet`
+        of it.
+        """
+        return jobset if isinstance(jobset, cls) else cls(jobset)
+
+    def column(self, name, xscale=None):
+        """
+        Return the values of the column `name` with the x-axis scale
+        `xscale`, computed on first access.
+        """
+        if xscale != 'time' or name not in self.TIME_COLUMNS + (
+                'execution_time',):
+            xscale = None
+        key = name, xscale
+        if key not in self._columns:
+            self._columns[key] = self._compute_column(name, xscale)
+        return self._columns[key]
+
+    def _compute_column(self, name, xscale):
+        if xscale == 'time':
+            if name == 'execution_time':
+                return (self.column('finish_time', xscale) -
+                        self.column('starting_time', xscale))
+            return epoch_to_datenum(self.column(name))
+        if name == 'jobsize':
+            return self.jobset.column('proc_alloc').values
+        return self.jobset.column(name).values
+
+    def frame(self, columns, xscale=None):
+        """
+        Return a new dataframe of the `columns` with the x-axis scale
+        `xscale`, which shares the prepared values.
+        """
+        return pandas.DataFrame(
+            {name: self.column(name, xscale) for name in columns},
+            columns=list(columns), index=self.jobset.column('jobID').index,
+            copy=False)
+
+    def load(self, name, xscale=None):
+        """
+        Return the load `name` (`'utilisation'` or `'queue'`) of the jobset
+        and the times of its events with the x-axis scale `xscale`.
+        """
+        load = getattr(self.jobset, name)
+        key = name, xscale
+        if key not in self._load_times:
+            times = numpy.asarray(load.index.values, dtype=float)
+            if xscale == 'time':
+                times = epoch_to_datenum(times)
+            self._load_times[key] = times
+        return load, self._load_times[key]
+
+
 _LayoutSpec = collections.namedtuple('_LayoutSpec', ('fig', 'spec'))
 _LayoutSpec.__doc__ += ': Helper object to share the layout specifications'
 _LayoutSpec.fig.__doc__ = 'Figure to be used by the visualization'
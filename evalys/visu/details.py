@@ -28,7 +28,15 @@ class DetailsLayout(core.EvalysLayout):
     def show(self):
         # hacky way to enforce sharing of axes
         axes = self.fig.get_axes()
-        axes[0].get_shared_x_axes().join(*axes)
+        shared = axes[0].get_shared_x_axes()
+        if hasattr(shared, 'join'):
+            shared.join(*axes)
+        else:
+            # the grouper of shared axes is read-only in recent matplotlib
+            for ax in axes[1:]:
+                if not shared.joined(axes[0], ax):
+                    ax.sharex(axes[0])
+        axes[0].set_xlim(axes[0].get_xlim())  # propagate the limits
 
         super().show()
 
@@ -54,9 +62,13 @@ def plot_details(jobset, *, title='Workload overview', **kwargs):
         'utilization': series.UtilizationSeriesVisualization,
     }
 
+    # the columns and arrays of the jobset are computed once for all the
+    # visualizations
+    prepared = core.PreparedJobSet(jobset)
+
     layout = DetailsLayout(wtitle=title)
     for spskey, visu_cls in visualizations.items():
         plot = layout.inject(visu_cls, spskey=spskey)
         utils.bulksetattr(plot, **kwargs)
-        plot.build(jobset)
+        plot.build(prepared)
     layout.show()
@@ -2,10 +2,11 @@
 
 import functools
 
+import matplotlib.collections
+import matplotlib.colors
 import matplotlib.dates
 import matplotlib.patches
 import numpy
-import pandas
 
 from . import core
 from .. import utils
@@ -57,6 +58,29 @@ class GanttVisualization(core.Visualization):
         The strategy to label jobs.  By default, the `jobID` column is used to
         label jobs.
         To disable the labeling of jobs, use :func:`~gantt.NOLABEL`.
+
+    :ivar raster:
+        Whether to paint the jobs into an image at the resolution of the axes
+        instead of drawing them as vector shapes.  In raster mode, the jobs
+        are not labeled.  It defaults to `None`, and the raster mode is used
+        for jobsets of more than `raster_threshold` jobs.
+
+    :ivar raster_threshold:
+        The number of jobs above which the raster mode is used by default.
+        It defaults to `core.GANTT_RASTER_THRESHOLD`.
+    :vartype raster_threshold: int
+
+    :ivar zoomable:
+        Whether to redraw the jobs when the figure is drawn after the limits
+        of the axe changed (e.g. when zooming interactively): only the
+        visible jobs are drawn, painted when they are more than
+        `raster_threshold` and drawn as labeled shapes otherwise.  It
+        defaults to `True`.
+    :vartype zoomable: bool
+
+    All the allocated intervals are drawn as a single `PolyCollection`.  The
+    default colorer and labeler are computed at once for all the jobs, custom
+    ones are called once per job.
     """
 
     COLUMNS = ('jobID', 'allocated_resources', 'execution_time',
@@ -68,8 +92,12 @@ class GanttVisualization(core.Visualization):
         self.xscale = None
         self.alpha = 0.4
         self.colorer = self.round_robin_map
-        self.labeler = lambda job: str(job['jobID'])
+        self.labeler = self.jobid_labeler
+        self.raster = None
+        self.raster_threshold = core.GANTT_RASTER_THRESHOLD
+        self.zoomable = True
         self._columns = self.COLUMNS
+        self._artists = []
 
     def _customize_layout(self):
         self._ax.grid(True)
@@ -84,82 +112,189 @@ class GanttVisualization(core.Visualization):
     def _adapt_uniq_num(df):
         df['uniq_num'] = numpy.arange(0, len(df))
 
-    @staticmethod
-    def _adapt_time_xscale(df):
-        # interpret columns with time aware semantics
-        df['submission_time'] = pandas.to_datetime(df['submission_time'], unit='s')
-        df['starting_time'] = pandas.to_datetime(df['starting_time'], unit='s')
-        df['execution_time'] = pandas.to_timedelta(df['execution_time'], unit='s')
-        df['finish_time'] = df['starting_time'] + df['execution_time']
-        # convert columns to use them with matplotlib
-        df['submission_time'] = df['submission_time'].map(matplotlib.dates.date2num)
-        df['starting_time'] = df['starting_time'].map(matplotlib.dates.date2num)
-        df['finish_time'] = df['finish_time'].map(matplotlib.dates.date2num)
-        df['execution_time'] = df['finish_time'] - df['starting_time']
-
     def _adapt(self, df):
         self._adapt_uniq_num(df)
-        if self.xscale == 'time':
-            self._adapt_time_xscale(df)
 
-    @staticmethod
-    def _annotate(rect, label):
-        rx, ry = rect.get_xy()
-        cx, cy = rx + rect.get_width() / 2.0, ry + rect.get_height() / 2.0
-        rect.axes.annotate(
-            label,
-            (cx, cy),
-            color='black',
-            fontsize='small',
-            ha='center',
-            va='center'
-        )
+    def _annotate(self, x, y, labels):
+        for cx, cy, label in zip(x, y, labels):
+            if not label:
+                continue
+            annotation = self._ax.annotate(
+                label,
+                (cx, cy),
+                color='black',
+                fontsize='small',
+                ha='center',
+                va='center'
+            )
+            self._artists.append(annotation)
 
     @staticmethod
     def round_robin_map(job, palette):
         return palette[job['uniq_num'] % len(palette)]
 
-    def _draw(self, df):
-        def _plot_job(job):
-            x0 = job['starting_time']
-            duration = job['execution_time']
-            for itv in job['allocated_resources'].intervals():
-                height = itv.sup - itv.inf + 1
-                rect = matplotlib.patches.Rectangle(
-                    (x0, itv.inf),
-                    duration,
-                    height,
-                    alpha=self.alpha,
-                    facecolor=functools.partial(self.colorer, palette=self.palette)(job),
-                    edgecolor='black',
-                    linewidth=0.5
-                )
-                self._ax.add_artist(rect)
-                self._annotate(rect, self.labeler(job))
-        #
-        df.apply(_plot_job, axis='columns')
+    @staticmethod
+    def jobid_labeler(job):
+        return str(job['jobID'])
+
+    def _job_colors(self, df):
+        if self.colorer is self.round_robin_map:
+            # same as the default colorer, for all the jobs at once
+            palette = matplotlib.colors.to_rgba_array(self.palette)
+            return palette[df['uniq_num'].values % len(palette)]
+        colorer = functools.partial(self.colorer, palette=self.palette)
+        return matplotlib.colors.to_rgba_array(
+            df.apply(colorer, axis='columns').tolist())
+
+    def _job_labels(self, df):
+        if self.labeler is NOLABEL:
+            return None
+        if self.labeler is self.jobid_labeler:
+            return df['jobID'].astype(str).values
+        return df.apply(self.labeler, axis='columns').values
+
+    def _draw(self, df, itvs):
+        if df.empty:
+            return
+        jobs, inf, sup = itvs
+        x0 = df['starting_time'].values[jobs]
+        duration = df['execution_time'].values[jobs]
+        height = sup - inf + 1
+        rects = matplotlib.collections.PolyCollection(
+            core.rectangles(x0, inf, duration, height),
+            alpha=self.alpha,
+            facecolors=self._job_colors(df)[jobs],
+            edgecolors='black',
+            linewidths=0.5
+        )
+        self._ax.add_collection(rects, autolim=False)
+        self._artists.append(rects)
+
+        labels = self._job_labels(df)
+        if labels is not None:
+            labels = labels[jobs]
+            # skip the labels larger than their rectangle
+            shown = core.fitting_labels(self._ax, x0, inf, duration, height,
+                                        labels)
+            self._annotate((x0 + duration / 2.0)[shown],
+                           (inf + height / 2.0)[shown], labels[shown])
+
+    def _draw_raster(self, colors, jobset, begin, end):
+        width = max(1, int(self._ax.get_window_extent().width))
+        image = core.gantt_raster(jobset, colors, self.alpha,
+                                  begin, end, width)
+        if self.xscale == 'time':
+            begin, end = core.epoch_to_datenum([begin, end])
+        image = self._ax.imshow(
+            image,
+            aspect='auto',
+            origin='lower',
+            interpolation='nearest',
+            extent=(begin, end,
+                    jobset.res_bounds.inf, jobset.res_bounds.sup + 1),
+        )
+        self._artists.append(image)
+
+    def _use_raster(self, df):
+        if self.raster is None:
+            return len(df) > self.raster_threshold
+        return self.raster
+
+    def _view_in_seconds(self):
+        begin, end = self._ax.get_xlim()
+        if self.xscale == 'time':
+            # from matplotlib dates back to timestamps
+            begin, end = core.datenum_to_epoch([begin, end])
+        return begin, end
+
+    def _update_view(self):
+        """
+        Redraw the jobs if the limits of the axe changed since they were
+        drawn.  A raster image only depends on the x limits.
+        """
+        xlim, ylim = self._ax.get_xlim(), self._ax.get_ylim()
+        drawn_xlim, drawn_ylim = self._drawn_view
+        if xlim != drawn_xlim or drawn_ylim not in (None, ylim):
+            self._redraw()
+
+    def _redraw(self):
+        """
+        Draw the jobs visible in the current limits of the axe only, at a
+        level of detail matching their number.
+        """
+        jobset, df = self._jobset, self._df
+        begin, end = self._view_in_seconds()
+        bottom, top = sorted(self._ax.get_ylim())
+        positions = jobset.running_index.overlapping(begin, end)
+        self._drawn_view = self._ax.get_xlim(), self._ax.get_ylim()
+
+        for artist in self._artists:
+            artist.remove()
+        self._artists = []
+        if len(positions) == 0:
+            return
+
+        visible = df.iloc[positions]
+        if self._use_raster(visible):
+            self._drawn_view = self._drawn_view[0], None
+            if self._colors is None:
+                self._colors = self._job_colors(df)
+            begin = max(begin, jobset.column('starting_time').min())
+            end = min(end, jobset.column('finish_time').max())
+            self._draw_raster(self._colors, jobset, begin, end)
+        else:
+            jobs, inf, sup = core.job_intervals(jobset, positions)
+            shown = (sup + 1 >= bottom) & (inf <= top)
+            self._draw(visible, (jobs[shown], inf[shown], sup[shown]))
 
     def build(self, jobset):
-        df = jobset.df.loc[:, self._columns]  # copy just what is needed
+        # the columns are shared with the other visualizations of the jobset,
+        # with the time columns already adapted to the x-axis scale
+        prepared = core.PreparedJobSet.of(jobset)
+        jobset = prepared.jobset
+        columns = self._columns
+        if (self.colorer is self.round_robin_map and
+                self.labeler in (self.jobid_labeler, NOLABEL)):
+            # the allocations are only needed by custom colorers and labelers
+            columns = [col for col in columns if col != 'allocated_resources']
+        df = prepared.frame(columns, self.xscale)
         self._adapt(df)  # extract the data required for the visualization
         self._customize_layout()  # prepare the layout for displaying the data
-        self._draw(df)  # do the painting job
-
-        # tweak boundaries to match the studied jobset
+        # tweak boundaries to match the studied jobset, before the painting
+        # job which sizes the labels against them
         self._ax.set(
             xlim=(df.submission_time.min(), df.finish_time.max()),
             ylim=(jobset.res_bounds.inf - 1, jobset.res_bounds.sup + 2),
         )
 
+        # do the painting job
+        self._colors = None
+        raster = self._use_raster(df)
+        if raster:
+            self._colors = self._job_colors(df)
+            self._draw_raster(self._colors, jobset,
+                              jobset.column('starting_time').min(),
+                              jobset.column('finish_time').max())
+        else:
+            self._draw(df, core.job_intervals(jobset))
+
+        # recompute the details when the figure is drawn after zooming
+        if self.zoomable:
+            self._jobset, self._df = jobset, df
+            xlim, ylim = self._ax.get_xlim(), self._ax.get_ylim()
+            self._drawn_view = xlim, None if raster else ylim
+            self._lspec.fig.add_artist(core.DrawHook(self._update_view))
 
 
 class DiffGanttVisualization(GanttVisualization):
     def __init__(self, lspec, *, title='Gantt charts comparison'):
         super().__init__(lspec, title=title)
         self.alpha = 0.5
-        self.colorer = lambda _, palette: palette[0]  # single color per jobset
+        # single color per jobset: the palette is set to this color only
+        self.colorer = self.round_robin_map
         self.labeler = NOLABEL  # do not label jobs
         self.palette = None  # let .build(…) figure the number of colors
+        self.zoomable = False  # the jobsets share the axe
 
     def build(self, jobsets):
         _orig_palette = self.palette  # save original palette
@@ -4,12 +4,12 @@ from __future__ import unicode_literals, print_function
 
 import matplotlib
 import matplotlib.dates
+import matplotlib.colors
 import matplotlib.patches as mpatch
+from matplotlib.collections import LineCollection, PolyCollection
 from matplotlib import pyplot as plt
 import numpy as np
 import pandas as pd
-import seaborn as sns
-import random
 
 from . import core
 from .. import metrics
@@ -33,45 +33,24 @@ def map_unique_numbers(df):
 
     Jobs which have the same jobID and workload_name will be merged together and the same
     unique_id will be assigned to them. The set of labeled_jobs will only contain the job
-    in the middle of each list of jobs sharing the same id.
+    in the middle of each list of jobs sharing the same id. Without a workload_name column
+    (e.g. Batsim outputs), the jobs are only identified by their jobID.
     """
-    labeled_jobs = set()
-    unique_numbers = []
-
-    # Jobs start their number with 1
-    number_counter = 1
-    numbers_map = {}
-    jobs_for_unique_number = {}
-
-    for index, row in df.iterrows():
-        workload_name = str(row["workload_name"])
-        job_id = str(row["jobID"])
-        full_job_id = workload_name + "!" + job_id
-        job_intervals=row['allocated_resources']
-
-        try:
-            # The job id was already in the workload: re-use the same unique id.
-            unique_number = numbers_map[full_job_id]
-            list_of_jobs = jobs_for_unique_number[full_job_id]
-        except KeyError:
-            # The job id is new: generate a new unique number for this
-            # workload_name!jobID combination.
-            unique_number = number_counter
-            numbers_map[full_job_id] = number_counter
-            number_counter += 1
-            jobs_for_unique_number[full_job_id] = list_of_jobs = []
-
-        if job_intervals:
-            list_of_jobs.append((index, row))
-
-        unique_numbers.append(unique_number)
-
-    for k, v in jobs_for_unique_number.items():
-        # If there are jobs for this job id which have job intervals:
-        # search for the element in the middle and add its index to the set.
-        if v:
-            index, row = v[len(v)//2]
-            labeled_jobs.add(index)
+    # Jobs start their number with 1, in order of first appearance
+    full_job_ids = df["jobID"].astype(str)
+    if "workload_name" in df:
+        full_job_ids = df["workload_name"].astype(str) + "!" + full_job_ids
+    codes, _ = pd.factorize(full_job_ids)
+    unique_numbers = (codes + 1).tolist()
+
+    # For each job id which has jobs with job intervals: the job in the
+    # middle of them is labeled.
+    with_intervals = df['allocated_resources'].astype(bool).values
+    candidates = pd.Series(df.index[with_intervals])
+    groups = candidates.groupby(codes[with_intervals])
+    middle = (groups.cumcount() ==
+              groups.transform('size') // 2).values
+    labeled_jobs = set(candidates[middle])
 
     return labeled_jobs, unique_numbers
 
@@ -80,20 +59,25 @@ def plot_gantt(jobset, ax=None, title="Gantt chart",
                labels=True, palette=None, alpha=0.4,
                time_scale=False,
                color_function=None,
-               label_function=None):
+               label_function=None,
+               raster=None):
+    """
+    Plot the Gantt chart of a jobset.
+
+    :param raster: whether to paint the jobs into an image at the
+        resolution of the axe instead of drawing them as vector shapes,
+        without labels. By default, the jobsets of more than
+        `core.GANTT_RASTER_THRESHOLD` jobs are painted.
+    """
     # Palette generation if needed
     if palette is None:
         palette = core.generate_palette(8)
     assert(len(palette) > 0)
 
-    if color_function is None:
-        def color_randrobin_select(job, palette):
-            return palette[job.unique_number % len(palette)]
-        color_function = color_randrobin_select
-    if label_function is None:
-        def job_id_label(job):
-            return job['jobID']
-        label_function = job_id_label
+    # By default, the colors of the palette are picked with a round-robin
+    # strategy on the unique numbers of the jobs and the jobs are labeled
+    # with their jobID: both are computed for all the jobs at once. Custom
+    # functions are called once per job.
 
     # Get current axe to plot
     if ax is None:
@@ -103,37 +87,68 @@ def plot_gantt(jobset, ax=None, title="Gantt chart",
     labeled_jobs, unique_numbers = map_unique_numbers(df)
     df["unique_number"] = unique_numbers
 
+    # one rectangle by allocated interval, all in a single collection
+    jobs, inf, sup = core.job_intervals(jobset)
+    starts = df['starting_time'].values
+    durations = df['execution_time'].values
     if time_scale:
+        # Convert dates to matplotlib float representation
+        finishes = core.epoch_to_datenum(starts + durations)
+        starts = core.epoch_to_datenum(starts)
+        durations = finishes - starts
+
         df['submission_time'] = pd.to_datetime(df['submission_time'], unit='s')
         df['starting_time'] = pd.to_datetime(df['starting_time'], unit='s')
         df['execution_time'] = pd.to_timedelta(df['execution_time'], unit='s')
 
-    def plot_job(job):
-        col = color_function(job, palette)
-        duration = job['execution_time']
-        for itv in job['allocated_resources'].intervals():
-            (y0, y1) = itv
-            x0 = job['starting_time']
-            if time_scale:
-                # Convert date to matplotlib float representation
-                x0 = matplotlib.dates.date2num(x0.to_pydatetime())
-                finish_time = matplotlib.dates.date2num(
-                    job['starting_time'] + job['execution_time']
-                )
-                duration = finish_time - x0
-            rect = mpatch.Rectangle((x0, y0), duration,
-                                    y1 - y0 + 0.9,
-                                    alpha=alpha,
-                                    facecolor=col,
-                                    edgecolor='black',
-                                    linewidth=0.5)
-            if labels:
-                if job.name in labeled_jobs:
-                    annotate(ax, rect, str(label_function(job)))
-            ax.add_artist(rect)
-
-    # apply for all jobs
-    df.apply(plot_job, axis=1)
+    if color_function is None:
+        palette_colors = matplotlib.colors.to_rgba_array(palette)
+        colors = palette_colors[df['unique_number'].values % len(palette)]
+    elif len(df):
+        colors = matplotlib.colors.to_rgba_array(
+            df.apply(color_function, axis=1, args=(palette,)).tolist())
+    else:
+        colors = np.zeros((0, 4))
+
+    if raster is None:
+        raster = len(df) > core.GANTT_RASTER_THRESHOLD
+    if raster:
+        # paint the jobs into an image, without labels, with a column by
+        # pixel of the axe
+        begin = jobset.df['starting_time'].min()
+        end = jobset.df['finish_time'].max()
+
+        def paint():
+            width = max(1, int(ax.get_window_extent().width))
+            return core.gantt_raster(jobset, colors, alpha, begin, end, width)
+
+        x_extent = (begin, end)
+        if time_scale:
+            x_extent = core.epoch_to_datenum([begin, end])
+        image = ax.imshow(paint(), aspect='auto', origin='lower',
+                          interpolation='nearest',
+                          extent=(x_extent[0], x_extent[1],
+                                  jobset.res_bounds.inf,
+                                  jobset.res_bounds.sup + 1))
+
+        def repaint():
+            # the figure may be resized or laid out after plotting
+            width = max(1, int(ax.get_window_extent().width))
+            if image.get_array().shape[1] != width:
+                image.set_data(paint())
+
+        ax.figure.add_artist(core.DrawHook(repaint))
+    else:
+        x0 = starts[jobs]
+        duration = durations[jobs]
+        height = sup - inf + 0.9
+        ax.add_collection(
+            PolyCollection(core.rectangles(x0, inf, duration, height),
+                           alpha=alpha,
+                           facecolors=colors[jobs],
+                           edgecolors='black',
+                           linewidths=0.5),
+            autolim=False)
 
     # set graph limits, grid and title
     ax.set_xlim(df['submission_time'].min(), (
@@ -143,6 +158,25 @@ def plot_gantt(jobset, ax=None, title="Gantt chart",
     ax.set_title(title)
     ax.set_ylabel("Machines")
 
+    if labels and labeled_jobs and not raster:
+        labeled = np.sort(df.index.get_indexer(list(labeled_jobs)))
+        job_labels = np.empty(len(df), dtype=object)
+        if label_function is None:
+            job_labels[labeled] = df['jobID'].iloc[labeled].astype(str).values
+        else:
+            job_labels[labeled] = [str(label_function(job)) for _, job
+                                   in df.iloc[labeled].iterrows()]
+        shown = np.flatnonzero(np.isin(jobs, labeled))
+        # skip the labels larger than their rectangle
+        shown = shown[core.fitting_labels(
+            ax, x0[shown], inf[shown], duration[shown], height[shown],
+            job_labels[jobs[shown]])]
+        for i in shown:
+            ax.annotate(job_labels[jobs[i]],
+                        (x0[i] + duration[i] / 2.0, inf[i] + height[i] / 2.0),
+                        color='black', fontsize='small',
+                        ha='center', va='center')
+
 
 def plot_pstates(pstates, x_horizon, ax=None, palette=None,
                  off_pstates=None,
@@ -409,65 +443,90 @@ def plot_gantt_general_shape(jobset_list, ax=None, alpha=0.3,
 
 
 def plot_job_details(dataframe, size, ax=None, title="Job details",
-                     time_scale=False, time_offset=0):
+                     time_scale=False, time_offset=0, density=None,
+                     TimeZoneString='UTC'):
+    """
+    Plot the submission, starting and finish times of the jobs against
+    their size, each event in its own zone, and link the events of the same
+    job.
+
+    :param density: whether to plot the density of the events in each zone
+        as hexagonal bins instead of the jobs one by one, without links. By
+        default, the dataframes of more than
+        `core.JOB_DETAILS_DENSITY_THRESHOLD` jobs are plotted as densities.
+    :param TimeZoneString: the time zone of the wall clock times shown when
+        `time_scale` is set.
+    """
     # TODO manage also the Jobset case
     # Get current axe to plot
     if ax is None:
         ax = plt.gca()
 
     # Avoid side effect
-    df = pd.DataFrame.copy(dataframe)
-    df = df.sort_values(by='jobID')
+    df = dataframe.sort_values(by='jobID')
+    submission_time = df['submission_time'].values
+    starting_time = submission_time + df['waiting_time'].values
+    finish_time = starting_time + df['execution_time'].values
 
-    df['submission_time'] = df['submission_time'] + time_offset
-    df['starting_time'] = df['submission_time'] + df['waiting_time']
-    df['finish_time'] = df['starting_time'] + df['execution_time']
+    if time_scale:
+        # interpret columns with time aware semantics and convert them to
+        # use them with matplotlib
+        submission_time, starting_time, finish_time = (
+            core.epoch_to_datenum(times, time_offset, TimeZoneString)
+            for times in (submission_time, starting_time, finish_time))
+    else:
+        submission_time, starting_time, finish_time = (
+            times + time_offset
+            for times in (submission_time, starting_time, finish_time))
 
     threshold = size * 1.05 # To separate the 3 "zones"
 
-    to_plot = [('submission_time', 'blue', '.', 0),
-               ('starting_time', 'green', '>', threshold),
-               ('finish_time', 'red', '|', threshold*2)]
-
-    lines = [['submission_time', 'starting_time', 'blue', 0, threshold],
-             ['starting_time', 'finish_time', 'green', threshold, threshold*2]]
-
-    if time_scale:
-        # interpret columns with time aware semantics
-        df['submission_time'] = pd.to_datetime(df['submission_time'], unit='s')
-        df['starting_time'] = pd.to_datetime(df['starting_time'], unit='s')
-        df['finish_time'] = pd.to_datetime(df['finish_time'], unit='s')
-        # convert columns to use them with matplotlib
-        df['submission_time'] = df['submission_time'].map(matplotlib.dates.date2num)
-        df['starting_time'] = df['starting_time'].map(matplotlib.dates.date2num)
-        df['finish_time'] = df['finish_time'].map(matplotlib.dates.date2num)
-
-    # select the axe
-    plt.sca(ax)
+    to_plot = [(submission_time, 'submission_time', 'blue', '.', 0),
+               (starting_time, 'starting_time', 'green', '>', threshold),
+               (finish_time, 'finish_time', 'red', '|', threshold*2)]
 
-    # plot lines
     # add jitter
     jitter = size / 20
-    random.seed(a=0)
-    new_proc_alloc = df['proc_alloc'].apply(
-        lambda x: x + random.uniform(-jitter, jitter))
-    for begin, end, color, treshold_begin, treshold_end in lines:
-        for i, item in df.iterrows():
-            x_begin = item[begin]
-            x_end = item[end]
-            plt.plot([x_begin, x_end], [new_proc_alloc[i] + treshold_begin,
-                                        new_proc_alloc[i] + treshold_end],
-                     color=color, linestyle='-', linewidth=1, alpha=0.2)
-
-    # plot one point per serie
-    for serie, color, marker, treshold in to_plot:
-        x = df[serie]
-        y = new_proc_alloc + treshold
-        plt.scatter(x, y, c=color, marker=marker,
-                    s=60, label=serie, alpha=0.5)
+    random = np.random.RandomState(0)
+    new_proc_alloc = (df['proc_alloc'].values +
+                      random.uniform(-jitter, jitter, len(df)))
+
+    if density is None:
+        density = len(df) > core.JOB_DETAILS_DENSITY_THRESHOLD
+    if density:
+        # plot the density of each serie in its zone, on the same grid
+        cmaps = {'blue': 'Blues', 'green': 'Greens', 'red': 'Reds'}
+        extent = (min(x.min() for x, _, _, _, _ in to_plot),
+                  max(x.max() for x, _, _, _, _ in to_plot),
+                  -jitter, threshold*2 + size + jitter)
+        handles = []
+        for x, serie, color, _, treshold in to_plot:
+            ax.hexbin(x, new_proc_alloc + treshold, cmap=cmaps[color],
+                      mincnt=1, bins='log', extent=extent,
+                      gridsize=(100, 60), edgecolors='none')
+            handles.append(mpatch.Patch(color=color, label=serie))
+        ax.legend(handles=handles)
+    else:
+        # plot lines, one collection per couple of zones
+        for idx in range(2):
+            x_begin, _, color, _, treshold_begin = to_plot[idx]
+            x_end, _, _, _, treshold_end = to_plot[idx + 1]
+            segments = np.stack([
+                np.column_stack([x_begin, new_proc_alloc + treshold_begin]),
+                np.column_stack([x_end, new_proc_alloc + treshold_end]),
+            ], axis=1)
+            ax.add_collection(LineCollection(
+                segments, colors=color, linestyles='-', linewidths=1,
+                alpha=0.2))
+
+        # plot one point per serie
+        for x, serie, color, marker, treshold in to_plot:
+            y = new_proc_alloc + treshold
+            ax.scatter(x, y, c=color, marker=marker,
+                       s=60, label=serie, alpha=0.5)
+        ax.legend()
 
     ax.grid(True)
-    ax.legend()
     ax.set_title(title)
     ax.set_ylabel("Job size")
     if time_scale:
@@ -521,6 +580,7 @@ def plot_fragmentation(frag, ax=None, label="Fragmentation"):
     ax[0].set_title("Fragmentation over resources")
 
     # plot distribution
+    import seaborn as sns
     sns.distplot(frag, ax=ax[1], label=label, kde=False, rug=True)
     ax[1].set_title("Fragmentation distribution")
 
@@ -533,22 +593,41 @@ def plot_fragmentation(frag, ax=None, label="Fragmentation"):
 
 def plot_load(load, nb_resources=None, ax=None, normalize=False,
               time_scale=False, legend_label='Load',
-              UnixStartTime=0, TimeZoneString='UTC'):
+              UnixStartTime=0, TimeZoneString='UTC', decimate=None):
     '''
     Plots the number of used resources against time
     :normalize: if True normalize by the number of resources
     `nb_resources`
+    :decimate: if True only the minimum, maximum and last loads of each
+    pixel column of the axe are plotted, so that the peaks and the idle
+    periods stay visible. By default, the loads of more than
+    `core.LOAD_DECIMATION_THRESHOLD` events are decimated.
+    :returns: the `Line2D` of the load
     '''
     mean = metrics.load_mean(load)
-    u = load.copy()
+
+    # get an axe if not provided
+    if ax is None:
+        ax = plt.gca()
+
+    if decimate is None:
+        decimate = len(load) > core.LOAD_DECIMATION_THRESHOLD
+    if decimate:
+        width = max(1, int(ax.get_window_extent().width))
+        times, values = core.decimate_steps(load.index.values,
+                                            load['load'].values, width)
+        u = pd.DataFrame({'load': values},
+                         index=pd.Index(times, name=load.index.name))
+    else:
+        u = load.copy()
 
     if time_scale:
         # make the time index a column
         u = u.reset_index()
         # convert timestamp to datetime
-        u.index = pd.to_datetime(u['time'] + UnixStartTime,
-                                 unit='s')
-        u.index.tz_localize('UTC').tz_convert(TimeZoneString)
+        u.index = pd.to_datetime(u['time'] + UnixStartTime, unit='s',
+                                 utc=True)
+        u.index = u.index.tz_convert(TimeZoneString).tz_localize(None)
 
     if normalize and nb_resources is None:
         nb_resources = u.load.max()
@@ -557,15 +636,12 @@ def plot_load(load, nb_resources=None, ax=None, normalize=False,
         u.load = u.load / nb_resources
         mean = mean / nb_resources
 
-    # get an axe if not provided
-    if ax is None:
-        ax = plt.gca()
-
     # leave room to have better view
     ax.margins(x=0.1, y=0.1)
 
     # plot load
     u.load.plot(drawstyle="steps-post", ax=ax, label=legend_label)
+    load_line = ax.get_lines()[-1]
 
     # plot a line for max available area
     if nb_resources and not normalize:
@@ -579,6 +655,7 @@ def plot_load(load, nb_resources=None, ax=None, normalize=False,
             [mean, mean],
             linestyle='--', linewidth=1,
             label="Mean {0} ({1:.2f})".format(legend_label, mean))
+    import seaborn as sns
     sns.rugplot(u.load[u.load == 0].index, ax=ax, color='r')
     ax.scatter([], [], marker="|", linewidth=1, s=200,
                label="Reset event ({} == 0)".format(legend_label), color='r')
@@ -589,6 +666,7 @@ def plot_load(load, nb_resources=None, ax=None, normalize=False,
     ax.grid(True)
     ax.legend()
     ax.set_ylabel("Machines")
+    return load_line
 
 def plot_free_resources(utilisation, nb_resources, normalize=False,
                         time_scale=False,
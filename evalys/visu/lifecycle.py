@@ -1,15 +1,41 @@
 # coding: utf-8
 
+import matplotlib.collections
+import matplotlib.dates
 import matplotlib.gridspec
 import matplotlib.lines
-import matplotlib.patches
 import matplotlib.pyplot
-import pandas
+import matplotlib.transforms
+import numpy
 
 from . import core
 from .. import utils
 
 
+class _LinkCollection(matplotlib.collections.LineCollection):
+    """
+    Segments linking points in the data coordinates of an origin `Axe` to
+    points in the data coordinates of a destination `Axe`.
+
+    The segments are drawn in display coordinates, and their ends are
+    transformed at draw time so that they follow the limits of both `Axe`.
+    """
+
+    def __init__(self, ax_orig, xy_orig, ax_dest, xy_dest, **kwargs):
+        super().__init__(
+            [], transform=matplotlib.transforms.IdentityTransform(), **kwargs
+        )
+        self._ax_orig, self._xy_orig = ax_orig, xy_orig
+        self._ax_dest, self._xy_dest = ax_dest, xy_dest
+
+    def draw(self, renderer):
+        self.set_segments(numpy.stack([
+            self._ax_orig.transData.transform(self._xy_orig),
+            self._ax_dest.transData.transform(self._xy_dest),
+        ], axis=1))
+        super().draw(renderer)
+
+
 class LifecycleVisualization(core.Visualization):
     """
     Visualization of the lifecycle of jobs in a jobset.
@@ -20,7 +46,8 @@ class LifecycleVisualization(core.Visualization):
     The x-axis represents time, while the y-axis represents the size of the
     jobs.
 
-    :cvar COLUMNS: The columns required to build the visualization.
+    :cvar COLUMNS: The columns required to build the visualization, as
+        prepared by `core.PreparedJobSet`.
 
     :cvar _events: The supported events.
 
@@ -66,9 +93,26 @@ class LifecycleVisualization(core.Visualization):
         * It defaults to `None`, and uses raw values by default.
         * If set to `log2`, the y-axis is transformed to show the values on a
           logarithmic scale in base 2.
+
+    :ivar links:
+        How to draw the links between the events of the same job.
+        Valid values are `'all'`, `'subsample'`, `'density'`, and `None`.
+
+        * It defaults to `'all'`, and links the events of all the jobs.
+        * If set to `subsample`, only the events of `max_links` jobs picked
+          at random are linked.
+        * If set to `density`, the events of all the jobs are linked, but the
+          transparency level of the links is lowered when there are more than
+          `max_links` jobs so that their density shows.
+        * If set to `None`, the events are not linked.
+
+    :ivar max_links:
+        The number of links used by the `'subsample'` and `'density'` modes.
+        It defaults to `5000`.
+    :vartype max_links: int
     """
 
-    COLUMNS = ('allocated_resources', 'finish_time', 'starting_time',
+    COLUMNS = ('jobsize', 'finish_time', 'starting_time',
                'submission_time', )
 
     _events = ('submit', 'start', 'finish')
@@ -88,6 +132,8 @@ class LifecycleVisualization(core.Visualization):
         self.alpha = 0.5
         self.xscale = None
         self.yscale = None
+        self.links = 'all'
+        self.max_links = 5000
         self._columns = self.COLUMNS
 
     def _set_axes(self):
@@ -147,22 +193,6 @@ class LifecycleVisualization(core.Visualization):
     def title(self, title):
         self._ax['finish'].set_title(title)  # finish is the top-most stripe
 
-    @staticmethod
-    def _adapt_jobsize(df):
-        df['jobsize'] = df['allocated_resources'].map(len)
-
-    def _adapt_time_xscale(self, df):
-        for column in self._ev2col.values():
-            # interpret column with time aware semantics
-            df[column] = pandas.to_datetime(df[column], unit='s')
-            # convert column to use it with matplotlib
-            df[column] = df[column].map(matplotlib.dates.date2num)
-
-    def _adapt(self, df):
-        self._adapt_jobsize(df)
-        if self.xscale == 'time':
-            self._adapt_time_xscale(df)
-
     def _draw(self, df):
         # plot each event with respect to job size
         for idx, event in enumerate(self._events):
@@ -172,27 +202,34 @@ class LifecycleVisualization(core.Visualization):
                 marker=self.markers[idx], markersize=self.markersizes[idx]
             )
 
-        # link events related to the same job
-        def _link_events(job):
-            xy = {
-                event: (job[self._ev2col[event]], job['jobsize'])
-                for event in self._events
-            }
-            links = ('submit', 'start'), ('start', 'finish')
-            for idx, (orig, dest) in enumerate(links):
-                link = matplotlib.patches.ConnectionPatch(
-                    xyA=xy[dest], xyB=xy[orig],
-                    axesA=self._ax[dest], axesB=self._ax[orig],
-                    coordsA='data', coordsB='data',
-                    alpha=0.4*self.alpha, color=self.palette[idx], linestyle='-'
-                )
-                self._ax[dest].add_artist(link)
-        #
-        df.apply(_link_events, axis='columns')
+        # link events related to the same job, one collection per couple of
+        # stripes
+        if self.links is None or df.empty:
+            return
+        jobs = numpy.arange(len(df))
+        alpha = 0.4*self.alpha
+        if self.links == 'subsample' and len(df) > self.max_links:
+            jobs = numpy.sort(numpy.random.RandomState(0).choice(
+                len(df), self.max_links, replace=False))
+        elif self.links == 'density' and len(df) > self.max_links:
+            alpha *= self.max_links / len(df)
+        jobsize = df['jobsize'].values[jobs]
+
+        def xy(event):
+            return numpy.column_stack(
+                [df[self._ev2col[event]].values[jobs], jobsize])
+
+        links = ('submit', 'start'), ('start', 'finish')
+        for idx, (orig, dest) in enumerate(links):
+            self._lspec.fig.add_artist(_LinkCollection(
+                self._ax[orig], xy(orig), self._ax[dest], xy(dest),
+                alpha=alpha, colors=[self.palette[idx]], linestyles='-'
+            ))
 
     def build(self, jobset):
-        df = jobset.df.loc[:, self._columns]  # copy just what is needed
-        self._adapt(df)  # extract the data required for the visualization
+        # the job sizes and the time columns adapted to the x-axis scale are
+        # shared with the other visualizations of the jobset
+        df = core.PreparedJobSet.of(jobset).frame(self._columns, self.xscale)
         self._customize_layout()  # prepare the layout for displaying the data
         self._draw(df)  # do the painting job
 
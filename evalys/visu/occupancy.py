@@ -0,0 +1,128 @@
+# coding: utf-8
+
+import matplotlib.dates
+import numpy
+
+from . import core
+from .. import utils
+
+
+class OccupancyVisualization(core.Visualization):
+    """
+    Visualization of the occupancy of each resource over time as a heatmap.
+
+    The `OccupancyVisualization` class displays the busy fraction of each
+    resource in fixed-width time bins, as computed by
+    `JobSet.occupancy_matrix`.
+    The x-axis represents time, while the y-axis represents resources.
+
+    :ivar _lspec: The specification of the layout for the visualization.
+    :vartype _lspec: `core._LayoutSpec`
+
+    :ivar _ax: The `Axe` to draw on.
+
+    :ivar palette: The palette of colors to be used.
+
+    :ivar xscale:
+        The requested adaptation of the x-axis scale.
+        Valid values are `None`, and `'time'`.
+
+        * It defaults to `None`, and uses raw values by default.
+        * If set to `time`, the x-axis interprets the data as timestamps, and
+          uses a time-aware semantic.
+
+    :ivar bin_width:
+        The width of the time bins.  It defaults to `None`, and then the
+        studied period is split in `nb_bins` bins.
+
+    :ivar nb_bins:
+        The number of time bins used when `bin_width` is not set.  It defaults
+        to `500`.
+    :vartype nb_bins: int
+
+    :ivar cmap:
+        The colormap of the heatmap.  It defaults to `'viridis'`.
+
+    :ivar colorbar:
+        Whether to draw the colorbar.  It defaults to `True`.
+    :vartype colorbar: bool
+    """
+
+    def __init__(self, lspec, *, title='Resources occupancy'):
+        super().__init__(lspec)
+        self.title = title
+        self.xscale = None
+        self.bin_width = None
+        self.nb_bins = 500
+        self.cmap = 'viridis'
+        self.colorbar = True
+
+    def _customize_layout(self):
+        self._ax.set_xlabel('Time')
+        self._ax.set_ylabel('Resources')
+
+        # adapt scale of axes if requested
+        if self.xscale == 'time':
+            self._ax.xaxis_date()
+            self._ax.xaxis.set_major_formatter(
+                matplotlib.dates.DateFormatter('%Y-%m-%d\n%H:%M:%S')
+            )
+
+    def _adapt_time_xscale(self, begin, end):
+        # interpret bounds with time aware semantics to use them with
+        # matplotlib
+        return core.epoch_to_datenum([begin, end])
+
+    def _draw(self, matrix, extent):
+        image = self._ax.imshow(
+            matrix,
+            aspect='auto',
+            origin='lower',
+            interpolation='nearest',
+            extent=extent,
+            cmap=self.cmap,
+            vmin=0,
+            vmax=1,
+        )
+        if self.colorbar:
+            self._lspec.fig.colorbar(image, ax=self._ax, label='Busy fraction')
+
+    def build(self, jobset):
+        jobset = core.PreparedJobSet.of(jobset).jobset
+        begin = jobset.column('starting_time').min()
+        end = jobset.column('finish_time').max()
+        bin_width = self.bin_width or max((end - begin) / self.nb_bins, 1)
+
+        # assemble the chunks whatever the size of the matrix
+        matrix = numpy.concatenate([
+            chunk for _, chunk in jobset.iter_occupancy_matrix(
+                bin_width, begin, end)
+        ])
+
+        self._customize_layout()  # prepare the layout for displaying the data
+        if self.xscale == 'time':
+            begin, end = self._adapt_time_xscale(begin, end)
+        extent = (begin, end,
+                  jobset.res_bounds.inf - 0.5, jobset.res_bounds.sup + 0.5)
+        self._draw(matrix, extent)  # do the painting job
+
+
+def plot_occupancy(jobset, *, title='Resources occupancy', **kwargs):
+    """
+    Helper function to create an occupancy heatmap of a workload.
+
+    :param jobset: The jobset under study.
+    :type jobset: ``JobSet``
+
+    :param title: The title of the window.
+    :type title: ``str``
+
+    :param \\**kwargs:
+        The keyword arguments to be fed to the constructor of the visualization
+        class.
+    """
+    layout = core.SimpleLayout(wtitle=title)
+    plot = layout.inject(OccupancyVisualization, spskey='all', title=title)
+    utils.bulksetattr(plot, **kwargs)
+    plot.build(jobset)
+    layout.show()
@@ -1,5 +1,7 @@
 # coding: utf-8
 
+import numpy
+
 from . import core
 from . import legacy  # TODO: remove dependency to legacy code
 from .. import utils
@@ -29,6 +31,18 @@ class SeriesVisualization(core.Visualization):
         * It defaults to `None`, and uses raw values by default.
         * If set to `time`, the x-axis interprets the data as timestamps, and
           uses a time-aware semantic.
+
+    :ivar zoomable:
+        Whether to redraw the series when the x limits of the axe change (e.g.
+        when zooming interactively): only the visible events are drawn,
+        decimated to a few points per pixel column when they are too many.
+        It defaults to `True`.
+    :vartype zoomable: bool
+
+    :ivar decimate:
+        Whether to draw only the minimum, maximum and last values of each
+        pixel column of the axe.  It defaults to `None`, and decimates the
+        series of more than `core.LOAD_DECIMATION_THRESHOLD` events.
     """
     _metric = None
     available_series = {}
@@ -56,19 +70,51 @@ class SeriesVisualization(core.Visualization):
         super().__init__(lspec)
         self.title = title
         self.xscale = None
+        self.zoomable = True
+        self.decimate = None
 
-    def build(self, jobset, legend_label):
+    def _redraw(self, ax):
+        """
+        Draw the events of the series visible in the current x limits of the
+        axe only, decimated to the width of the axe if requested.
+        """
+        line, x, y = self._series
+        begin, end = ax.get_xlim()
+        # keep the events just outside the view to draw the steps entering
+        # and leaving it
+        first = max(numpy.searchsorted(x, begin, side='right') - 1, 0)
+        last = numpy.searchsorted(x, end, side='left') + 1
+        x, y = x[first:last], y[first:last]
+        decimate = self.decimate
+        if decimate is None:
+            decimate = len(x) > core.LOAD_DECIMATION_THRESHOLD
+        if decimate:
+            width = max(1, int(ax.get_window_extent().width))
+            x, y = core.decimate_steps(x, y, width)
+        line.set_data(x, y)
+
+    def build(self, jobset, legend_label=None):
         # TODO: remove dependency to legacy code
         # XXX: palette is not injected properly
         # XXX: we are missing the normalize parameter
-        legacy.plot_load(
-            load=getattr(jobset, self._metric),
+        prepared = core.PreparedJobSet.of(jobset)
+        jobset = prepared.jobset
+        load, times = prepared.load(self._metric, self.xscale)
+        line = legacy.plot_load(
+            load=load,
             nb_resources=jobset.MaxProcs,
             ax=self._ax,
             time_scale=(self.xscale == 'time'),
-            legend_label=legend_label
+            legend_label=legend_label or self.title,
+            decimate=self.decimate
         )
 
+        # recompute the details from all the events when zooming
+        if self.zoomable:
+            self._series = (line, times,
+                            numpy.asarray(load['load'].values, dtype=float))
+            self._ax.callbacks.connect('xlim_changed', self._redraw)
+
 
 def register(*, name, column=None):
     """
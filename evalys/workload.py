@@ -10,12 +10,15 @@ from __future__ import unicode_literals, print_function
 from collections import OrderedDict
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+import os
 import re
+import time
 import datetime
-from evalys.metrics import compute_load, load_mean
-from evalys.utils import cut_workload
-from evalys.visu import legacy as vleg
+from evalys.cache import TraceCache
+from evalys.intervals import IntervalTree
+from evalys.metrics import compute_load, LoadIndex
+from evalys.utils import cut_workload_many, open_trace, \
+    split_compression_extension
 
 
 class Workload(object):
@@ -179,37 +182,119 @@ class Workload(object):
 
         # property initialization
         self._utilisation = None
+        self._utilisation_index = None
         self._queue = None
+        self._running_index = None
+        self._queued_index = None
         self._jobs_per_week_per_users = None
         self._fraction_jobs_by_job_size = None
         self._arriving_each_day = None
         self._arriving_each_hour = None
 
+    swf_columns = ['jobID', 'submission_time', 'waiting_time',
+                   'execution_time', 'proc_alloc', 'cpu_used', 'mem_used',
+                   'proc_req', 'user_est', 'mem_req', 'status', 'uid',
+                   'gid', 'exe_num', 'queue', 'partition', 'prev_jobs',
+                   'think_time']
+
+    owf_columns = ['job_id', 'submission_time', 'start_time', 'stop_time',
+                   'walltime', 'nb_default_ressources', 'nb_extra_ressources',
+                   'status', 'user', 'command', 'queue', 'name', 'array',
+                   'type', 'reservation', 'cigri_id']
+
+    # columns that are always loaded, even when pruning with usecols
+    __required_columns = {
+        'swf': ['jobID', 'submission_time', 'waiting_time', 'execution_time',
+                'proc_alloc', 'proc_req', 'status'],
+        'owf': ['job_id', 'submission_time', 'start_time', 'stop_time',
+                'walltime', 'nb_default_ressources', 'status', 'user'],
+    }
+
+    # compact dtypes for identifiers and counts, times are kept as float64:
+    # float32 is not precise enough for timestamps over long traces
+    __dtypes = {
+        'swf': {col: np.int32 for col in ['jobID', 'proc_alloc', 'proc_req',
+                                          'status', 'uid', 'gid', 'exe_num',
+                                          'queue', 'partition', 'prev_jobs']},
+        'owf': {col: np.int32 for col in ['job_id', 'nb_default_ressources',
+                                          'nb_extra_ressources', 'status']},
+    }
+
     @classmethod
-    def from_csv(cls, filename):
+    def from_csv(cls, filename, cache=None, usecols=None, verbose=False):
         '''
         Import SWF or OWF CSV file.
+
+        The header metadata and the jobs are read in a single pass over the
+        file.
+
         :param filename: SWF or OWF file path
+        :param cache: if set, use an on-disk cache of the parsed workload
+            (see :py:mod:`evalys.cache`). It can be ``True`` to use the
+            default cache directory, a directory path or a
+            :py:class:`~evalys.cache.TraceCache`.
+        :param usecols: if set, only load these columns of the file (see
+            :py:attr:`swf_columns` and :py:attr:`owf_columns`) in addition
+            to the ones needed by the workload metrics.
+        :param verbose: if True, print the parse throughput.
+
+        Compressed traces (e.g. ``trace.swf.gz``) are decompressed on the
+        fly, see :py:func:`evalys.utils.open_trace`.
         '''
-        file_extension = filename.split('.')[-1] 
+        # look past the compression extension to detect the format
+        base_filename, _ = split_compression_extension(filename)
+        file_extension = base_filename.split('.')[-1]
 
         # If not recognize as owf swf is the default
         if file_extension != 'owf':
             file_extension = 'swf'
 
         if file_extension == 'swf':
-            columns = ['jobID', 'submission_time', 'waiting_time',
-                       'execution_time', 'proc_alloc', 'cpu_used', 'mem_used',
-                       'proc_req', 'user_est', 'mem_req', 'status', 'uid',
-                       'gid', 'exe_num', 'queue', 'partition', 'prev_jobs',
-                       'think_time']
+            names = cls.swf_columns
         else:
-            columns = ['job_id', 'submission_time', 'start_time', 'stop_time', 'walltime',
-                       'nb_default_ressources', 'nb_extra_ressources', 'status', 'user',
-                       'command', 'queue', 'name', 'array', 'type', 'reservation', 'cigri_id']
-            
-        df_tmp = pd.read_csv(filename, comment=';', names=columns,
-                         header=0, delim_whitespace=True)
+            names = cls.owf_columns
+
+        columns = names
+        if usecols is not None:
+            unknown = set(usecols) - set(names)
+            if unknown:
+                raise ValueError('Unknown {} columns: {}'.format(
+                    file_extension, sorted(unknown)))
+            selected = set(usecols) | set(
+                cls.__required_columns[file_extension])
+            columns = [col for col in names if col in selected]
+        dtypes = {col: dtype
+                  for col, dtype in cls.__dtypes[file_extension].items()
+                  if col in columns}
+
+        cache = TraceCache.from_option(cache)
+        cache_kind = 'workload:' + ','.join(columns)
+        if cache is not None:
+            entry = cache.load(filename, cache_kind)
+            if entry is not None:
+                df, arrays, attributes = entry
+                df.index = arrays['index']
+                return cls(df, attributes['format'], **attributes['metadata'])
+
+        start = time.time()
+        with open_trace(filename, 'rb') as trace:
+            # process header: peek at the next line so that the first job
+            # is not consumed, compressed streams cannot seek backward
+            metadata = {}
+            while trace.peek(1)[:1] == b';':
+                line = trace.readline().decode('utf-8', 'replace')
+                m = re.search(r"^;\s(.*):\s(.*)", line)
+                if m:
+                    metadata[m.group(1).strip()] = m.group(2).strip()
+
+            # process jobs from the first line after the header
+            df_tmp = pd.read_csv(trace, sep=r'\s+', comment=';', header=None,
+                                 names=names, usecols=columns)
+
+        # downcast integer fields afterwards: it is faster than giving the
+        # dtypes to the parser and it leaves float valued fields untouched
+        df_tmp = df_tmp.astype({col: dtype for col, dtype in dtypes.items()
+                                if df_tmp[col].dtype.kind == 'i'})
 
         if file_extension == 'owf':
             # 
@@ -236,26 +321,28 @@ class Workload(object):
         # - remove job checkpoint information (job status != 0 or 1)
         df = df[df['status'] <= 1]
 
-        # process header
-        header_file = open(filename, 'r')
-        header = ''
-        metadata = {}
-        for line in header_file:
-            if re.match("^;", line):
-                header += line
-                m = re.search("^;\s(.*):\s(.*)", line)
-                if m:
-                    metadata[m.group(1).strip()] = m.group(2).strip()
-            else:
-                # header is finished
-                break
+        if verbose:
+            duration = time.time() - start
+            size = os.path.getsize(filename) / 1e6
+            print("Parsed {} jobs ({:.1f} MB) from {} in {:.3f}s: "
+                  "{:.1f} MB/s".format(len(df_tmp), size, filename, duration,
+                                       size / duration if duration else 0))
+
+        if cache is not None:
+            cache.store(filename, cache_kind, df,
+                        arrays={'index': df.index.values},
+                        attributes={'format': file_extension,
+                                    'metadata': metadata})
 
         return cls(df, file_extension, **metadata)
 
-    def to_csv(self, filename):
+    def to_csv(self, filename, compression='infer'):
         '''
         Export the workload as SWF format CSV file
         :param filename: exported SWF file path
+        :param compression: compression of the exported file, by default it
+            is inferred from the file extension (e.g. ``trace.swf.gz``). See
+            :py:func:`evalys.utils.open_trace`.
         '''
         # Write metadata
         metadata = ""
@@ -263,7 +350,7 @@ class Workload(object):
             if hasattr(self, elem):
                 metadata += "; {}: {}\n".format(elem, getattr(self, elem))
         if metadata:
-            with open(filename, 'w') as f:
+            with open_trace(filename, 'wt', compression) as f:
                 f.writelines(metadata)
                 self.df.to_csv(f, index=False, header=False,
                                sep="\t")
@@ -313,14 +400,85 @@ class Workload(object):
                                          'proc_alloc', self.UnixStartTime)
         return self._utilisation
 
+    @property
+    def utilisation_index(self):
+        '''
+        :py:class:`LoadIndex` on the utilisation, built once, to compute the
+        mean utilisation over many time windows.
+        '''
+        if self._utilisation_index is None:
+            self._utilisation_index = LoadIndex(self.utilisation)
+        return self._utilisation_index
+
+    @property
+    def running_index(self):
+        '''
+        :py:class:`~evalys.intervals.IntervalTree` of the jobs from their
+        starting time to their finish time, built once.
+        '''
+        if self._running_index is None:
+            starting_time = (self.df['submission_time'] +
+                             self.df['waiting_time'])
+            self._running_index = IntervalTree(
+                starting_time, starting_time + self.df['execution_time'])
+        return self._running_index
+
+    @property
+    def queued_index(self):
+        '''
+        :py:class:`~evalys.intervals.IntervalTree` of the jobs from their
+        submission time to their starting time, built once.
+        '''
+        if self._queued_index is None:
+            self._queued_index = IntervalTree(
+                self.df['submission_time'],
+                self.df['submission_time'] + self.df['waiting_time'])
+        return self._queued_index
+
+    def jobs_running_at(self, time):
+        '''
+        :returns: the jobs running at `time` (started and not finished)
+        '''
+        return self.df.iloc[self.running_index.at(time)]
+
+    def jobs_queued_at(self, time):
+        '''
+        :returns: the jobs in the queue at `time` (submitted and not
+            started)
+        '''
+        return self.df.iloc[self.queued_index.at(time)]
+
+    def jobs_running_between(self, begin_time, end_time):
+        '''
+        :returns: the jobs running at some point between `begin_time` and
+            `end_time`
+        '''
+        return self.df.iloc[
+            self.running_index.overlapping(begin_time, end_time)]
+
+    def nb_jobs_running_at(self, times):
+        '''
+        :returns: the number of jobs running at each time of `times`
+        '''
+        return self.running_index.count_at(times)
+
+    def nb_jobs_queued_at(self, times):
+        '''
+        :returns: the number of jobs in the queue at each time of `times`
+        '''
+        return self.queued_index.count_at(times)
+
     def plot(self, normalize=False, with_details=False, time_scale=False):
         """
         Plot workload general informations.
 
         :args with_details:
-            if True show the job submission, start and finish time
-            (Warning: don't use this on large traces.
+            if True show the job submission, start and finish time (as
+            densities on large traces)
         """
+        # plotting libraries are only loaded when plotting
+        import matplotlib.pyplot as plt
+        from evalys.visu import legacy as vleg
         nrows = 2
         if with_details:
             nrows = nrows + 1
@@ -328,15 +486,98 @@ class Workload(object):
         vleg.plot_load(self.utilisation, self.MaxProcs, time_scale=time_scale,
                        UnixStartTime=self.UnixStartTime,
                        TimeZoneString=self.TimeZoneString,
-                       load_label="utilisation", ax=axe[0],
+                       legend_label="utilisation", ax=axe[0],
                        normalize=normalize)
         vleg.plot_load(self.queue, self.MaxProcs, time_scale=time_scale,
                        UnixStartTime=self.UnixStartTime,
                        TimeZoneString=self.TimeZoneString,
-                       load_label="queue", ax=axe[1], normalize=normalize)
+                       legend_label="queue", ax=axe[1], normalize=normalize)
         if with_details:
-            vleg.plot_job_details(self.df, self.MaxProcs, time_scale=time_scale,
-                                  time_offset=self.UnixStartTime)
+            vleg.plot_job_details(self.df, self.MaxProcs, ax=axe[2],
+                                  time_scale=time_scale,
+                                  time_offset=self.UnixStartTime,
+                                  TimeZoneString=self.TimeZoneString)
+
+    def _candidate_starts(self, period, stride):
+        times = self.utilisation_index.times
+        first, last = times[0], times[-1]
+        if stride is None:
+            # back to back periods without the first and the last ones
+            return np.arange(first, last, period)[1:-1]
+        if isinstance(stride, str):
+            if stride != 'events':
+                raise ValueError("Unknown stride: {}".format(stride))
+            return times[times + period <= last]
+        if np.ndim(stride) == 0:
+            starts = np.arange(first, last - period + 1, stride * 60 * 60)
+            return starts[starts + period <= last]
+        return np.asarray(stride)
+
+    def find_periods_with_given_utilisation(self,
+                                            periods_in_hours,
+                                            utilisations,
+                                            variation=0.01,
+                                            stride=None):
+        '''
+        Find the periods of the workload with a given mean utilisation
+        (between 0 and 1). Several period lengths (in hours) and several
+        utilisations can be given: the mean utilisation of all the candidate
+        periods is computed at once on the :py:attr:`utilisation_index`.
+
+        :args stride:
+            where the candidate periods start. ``None`` (default) gives
+            back to back periods, a number gives periods starting every
+            `stride` hours, ``'events'`` gives periods starting at each
+            utilisation change, and an array gives the start times directly.
+
+        :returns:
+            a dataframe of the matching periods with the columns `begin`,
+            `end`, `period_in_hours`, `utilisation`, `mean_util` and
+            `norm_mean_util`, sorted by period length and utilisation then
+            in the order of the candidate starts.
+
+        For example:
+
+        >>> from evalys.workload import Workload
+        >>> w = Workload.from_csv("./examples/UniLu-Gaia-2014-2.swf")
+        >>> periods = w.find_periods_with_given_utilisation(
+        ...     [12, 60], [0.2, 0.5, 0.8], variation=0.1, stride='events')
+        '''
+        periods_in_hours = np.atleast_1d(periods_in_hours)
+        utilisations = np.atleast_1d(utilisations)
+
+        begins = []
+        lengths = []
+        for period_in_hours in periods_in_hours:
+            starts = self._candidate_starts(period_in_hours * 60 * 60,
+                                            stride)
+            begins.append(starts)
+            lengths.append(np.full(len(starts), period_in_hours))
+        begins = np.concatenate(begins)
+        lengths = np.concatenate(lengths)
+        ends = begins + lengths * 60 * 60
+
+        mean_util = self.utilisation_index.mean(begin=begins, end=ends)
+        norm_mean_util = mean_util / self.MaxProcs
+
+        # match every candidate period with every utilisation
+        norm = norm_mean_util[:, np.newaxis]
+        match = ((norm >= utilisations - variation) &
+                 (norm <= utilisations + variation))
+        period_idx, util_idx = np.nonzero(match)
+        order = np.lexsort((utilisations[util_idx], lengths[period_idx]))
+        period_idx = period_idx[order]
+        util_idx = util_idx[order]
+
+        return pd.DataFrame({
+            'begin': begins[period_idx],
+            'end': ends[period_idx],
+            'period_in_hours': lengths[period_idx],
+            'utilisation': utilisations[util_idx],
+            'mean_util': mean_util[period_idx],
+            'norm_mean_util': norm_mean_util[period_idx],
+        }, columns=['begin', 'end', 'period_in_hours', 'utilisation',
+                    'mean_util', 'norm_mean_util'])
 
     def extract_periods_with_given_utilisation(self,
                                                period_in_hours,
@@ -347,49 +588,28 @@ class Workload(object):
                                                merge_change_submit_times=False,
                                                randomize_starting_times=False,
                                                random_seed=0,
-                                               max_nb_jobs=None):
+                                               max_nb_jobs=None,
+                                               stride=None):
         '''
         This extract from the workload a period (in hours) with a given mean
         utilisation (between 0 and 1).
 
+        The candidate periods are given by `stride`, see
+        :py:meth:`find_periods_with_given_utilisation`.
+
         :returns:
             a list of workload of the given periods, with the given
             utilisation, extracted from the this workload.
         '''
-        norm_util = self.utilisation
-
-        # resample the dataframe with the given period
         if randomize_starting_times:
+            times = self.utilisation_index.times
             np.random.seed(random_seed)
-            c = np.random.choice(norm_util.index, size=50)
-            time_periods = np.compress(
-                c <= max(norm_util.index) - period_in_hours * (60 * 60), c)
-        else:
-            time_periods = np.arange(min(norm_util.index),
-                                     max(norm_util.index),
-                                     60 * 60 * period_in_hours)
-        mean_data = {
-            'begin': [],
-            'end': [],
-            'mean_util': [],
-        }
-        for index, val in enumerate(time_periods):
-            if index == len(time_periods) - 1 or index == 0:
-                continue
-
-            begin = val
-            end = val + period_in_hours * (60 * 60)
-
-            mean_data['begin'].append(begin)
-            mean_data['end'].append(end)
-            mean_data['mean_util'].append(load_mean(norm_util, begin=begin, end=end))
-
-        mean_df = pd.DataFrame(data=mean_data)
-        mean_df["norm_mean_util"] = mean_df.mean_util / self.MaxProcs
-        periods = mean_df.loc[
-            lambda x: x.norm_mean_util >= (utilisation - variation)].loc[
-                lambda x: x.norm_mean_util <= (utilisation + variation)
-        ]
+            c = np.random.choice(times, size=50)
+            stride = np.compress(
+                c <= times[-1] - period_in_hours * (60 * 60), c)[1:-1]
+
+        periods = self.find_periods_with_given_utilisation(
+            period_in_hours, utilisation, variation=variation, stride=stride)
 
         # Only take nb_max periods if it is defined
         if nb_max:
@@ -427,8 +647,14 @@ class Workload(object):
 
         extracted = []
 
-        def do_extract(period):
-            to_export = cut_workload(self.df, period.begin, period.end)
+        # find the jobs of all the periods at once
+        begins = periods['begin'].values
+        ends = periods['end'].values
+        cuts = cut_workload_many(self.df, begins, ends)
+
+        for begin, end, cut in zip(begins, ends, cuts):
+            to_export = {key: self.df.iloc[positions].reset_index(drop=True)
+                         for key, positions in cut.items()}
             if merge_basic:
                 wload = pd.concat(to_export.values())
             elif merge_change_submit_times:
@@ -437,7 +663,7 @@ class Workload(object):
                 wload = to_export["workload"]
 
                 running['submission_time'] = running['submission_time'] + running['waiting_time']
-                queued['submission_time'] = period['begin'].min()
+                queued['submission_time'] = begin
 
                 wload = pd.concat([running, queued, wload])
             else:
@@ -450,14 +676,12 @@ class Workload(object):
                           # Installation=self.Installation,
                           # Note=notes,
                           MaxProcs=str(self.MaxProcs),
-                          UnixStartTime=int(period.begin),
+                          UnixStartTime=int(begin),
                           TimeZoneString=self.TimeZoneString,
-                          ExtractBegin=period.begin,
-                          ExtractEnd=period.end)
+                          ExtractBegin=begin,
+                          ExtractEnd=end)
             extracted.append(wl)
 
-        periods.apply(do_extract, axis=1)
-
         if max_nb_jobs is not None:
             extracted = [x for x in extracted if x.df.shape[0] <= max_nb_jobs]
 
@@ -28,28 +28,32 @@ def extract_periods(w, swf_trace):
     }
 
     os.makedirs(results_dir, exist_ok=True)
-    for period in [60]:
-
-        for util in range(1, 10):
-            res_table = w.extract_periods_with_given_utilisation(
-                period, util / 10, variation=variation, nb_max=20)
-
-            for i, results in enumerate(res_table):
-                filename = "extracted_{}_{}H_{}util+-{}_{}".format(
-                    swf_trace,
-                    period, util * 10,
-                    variation,
-                    i)
-                print("Export: {} \n{}".format(filename, results))
-                filepath = results_dir + "/" + filename + ".swf"
-                results.to_csv(filepath)
-                # Add metadata
-                metadata['file'].append(filename)
-                metadata['begin'].append(results.ExtractBegin)
-                metadata['end'].append(results.ExtractEnd)
-                metadata['norm_util'].append(util / 10)
-                metadata['variation'].append(variation)
-                metadata['period_in_hours'].append(period)
+    # search all the periods and utilisations at once
+    all_periods = w.find_periods_with_given_utilisation(
+        [60], [util / 10 for util in range(1, 10)], variation=variation)
+
+    for (period, norm_util), periods in all_periods.groupby(
+            ['period_in_hours', 'utilisation']):
+        notes = ("Period of {} hours with a mean utilisation "
+                 "of {}".format(period, norm_util))
+        res_table = w.extract(periods[:20], notes)
+
+        for i, results in enumerate(res_table):
+            filename = "extracted_{}_{:g}H_{}util+-{}_{}".format(
+                swf_trace,
+                period, int(round(norm_util * 100)),
+                variation,
+                i)
+            print("Export: {} \n{}".format(filename, results))
+            filepath = results_dir + "/" + filename + ".swf"
+            results.to_csv(filepath)
+            # Add metadata
+            metadata['file'].append(filename)
+            metadata['begin'].append(results.ExtractBegin)
+            metadata['end'].append(results.ExtractEnd)
+            metadata['norm_util'].append(norm_util)
+            metadata['variation'].append(variation)
+            metadata['period_in_hours'].append(period)
 
     pd.DataFrame(data=metadata).to_csv(results_dir + "/extract_metadata.csv", index=False)
 
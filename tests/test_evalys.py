@@ -11,6 +11,8 @@ Tests for `evalys` module.
 
 import unittest
 
+from procset import ProcSet
+
 from evalys import evalys
 
 
@@ -27,6 +29,139 @@ class TestEvalys(unittest.TestCase):
         js0 = JobSet.from_csv("/tmp/jobs.csv")
         assert js.df.equals(js0.df)
 
+    def test_parse_allocated_resources(self):
+        from evalys.jobset import parse_allocated_resources
+        offsets, inf, sup = parse_allocated_resources(
+            ['1-2 5 10-50', '20 19', '', '3-4 1-3 8'])
+        assert list(offsets) == [0, 3, 4, 4, 6]
+        assert list(inf) == [1, 5, 10, 19, 1, 8]
+        assert list(sup) == [2, 5, 50, 20, 4, 8]
+
+        js = evalys.JobSet.from_csv("./tests/oar_out_jobs.csv")
+        assert js.allocated_procset(1) == ProcSet((19, 20))
+        assert list(js.df.proc_alloc) == \
+            list(js.df.allocated_resources.apply(len))
+
+    def test_cache(self):
+        import tempfile
+        from evalys.cache import TraceCache
+        from evalys.workload import Workload
+        cache = TraceCache(tempfile.mkdtemp())
+
+        js = evalys.JobSet.from_csv("./tests/oar_out_jobs.csv", cache=cache)
+        js_cached = evalys.JobSet.from_csv("./tests/oar_out_jobs.csv",
+                                           cache=cache)
+        assert len(cache.entries()) == 1
+        assert js_cached.res_bounds == js.res_bounds
+        assert js_cached.df.equals(js.df)
+
+        w = Workload.from_csv("./tests/easy_mediumWL_smallPF.swf",
+                              cache=cache)
+        w_cached = Workload.from_csv("./tests/easy_mediumWL_smallPF.swf",
+                                     cache=cache)
+        assert w_cached.df.equals(w.df)
+        assert len(cache.entries()) == 2
+
+        # the least recently used entry is evicted first
+        cache.max_size = cache.entries()[-1][1]
+        cache.evict()
+        assert len(cache.entries()) == 1
+
+    def test_workload_import(self):
+        import numpy as np
+        from evalys.workload import Workload
+        w = Workload.from_csv("./tests/easy_mediumWL_smallPF.swf")
+        # the first job is not taken as a header line
+        assert len(w.df) == 800
+        assert w.df.jobID.iloc[0] == 0
+        assert w.df.proc_alloc.dtype == np.int32
+
+        w = Workload.from_csv("./examples/oar_trace_server.owf",
+                              usecols=['queue'])
+        assert len(w.df) == w.MaxJobs
+        assert 'queue' in w.df
+        assert 'command' not in w.df
+        assert w.UnixStartTime == 1519376667
+
+    def test_find_periods(self):
+        import numpy as np
+        from evalys.workload import Workload
+        w = Workload.from_csv("./tests/easy_mediumWL_smallPF.swf")
+        w.MaxProcs = 32
+        periods = w.find_periods_with_given_utilisation(
+            [0.5, 1], [0.5, 0.8], variation=0.1, stride='events')
+        assert set(periods.period_in_hours) == {0.5, 1}
+        assert (abs(periods.norm_mean_util - periods.utilisation) <=
+                0.1).all()
+        mean_util = w.utilisation_index.mean(periods.begin, periods.end)
+        assert (mean_util == periods.mean_util).all()
+        assert np.allclose(periods.end - periods.begin,
+                           periods.period_in_hours * 3600)
+
+        # the periods with a numeric stride end before the last event
+        last = w.utilisation_index.times[-1]
+        strided = w.find_periods_with_given_utilisation(
+            [1, 1.8409], [0.5, 0.8], variation=0.5, stride=0.1)
+        assert len(strided) > 0
+        assert (strided.end <= last).all()
+
+        grid = w.find_periods_with_given_utilisation(0.5, 0.8, variation=0.1)
+        assert len(grid) == 3
+        assert len(periods.query('period_in_hours == 0.5 and '
+                                 'utilisation == 0.8')) > len(grid)
+
+    def test_cut_workload_many(self):
+        from evalys.utils import cut_workload, cut_workload_many
+        from evalys.workload import Workload
+        df = Workload.from_csv("./tests/easy_mediumWL_smallPF.swf").df
+        starting_time = df.submission_time + df.waiting_time
+        finish_time = starting_time + df.execution_time
+        first = df.submission_time.iloc[10]
+        begins = [first, first + 2000, first + 5000]
+        ends = [first + 3000, first + 2500, first + 20000]
+        cuts = cut_workload_many(df, begins, ends)
+        assert len(cuts) == 3
+        for begin, end, cut in zip(begins, ends, cuts):
+            workload = df.iloc[cut["workload"]]
+            assert ((workload.submission_time >= begin) &
+                    (workload.submission_time < end)).all()
+            assert len(workload) == ((df.submission_time >= begin) &
+                                     (df.submission_time < end)).sum()
+            assert workload.jobID.is_monotonic_increasing
+            queue = df.iloc[cut["queue"]]
+            assert len(queue) == ((df.submission_time < begin) &
+                                  (starting_time >= begin)).sum()
+            running = df.iloc[cut["running"]]
+            assert len(running) == ((starting_time < begin) &
+                                    (finish_time > begin)).sum()
+            single = cut_workload(df, begin, end)
+            assert list(single["running"].jobID) == list(running.jobID)
+
+    def test_compressed_traces(self):
+        import gzip
+        import shutil
+        import tempfile
+        from evalys.workload import Workload
+        tmpdir = tempfile.mkdtemp()
+
+        owf = tmpdir + "/oar_trace_server.owf.gz"
+        with open("./examples/oar_trace_server.owf", 'rb') as src, \
+                gzip.open(owf, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        w = Workload.from_csv(owf)
+        assert w.format == 'owf'
+        assert w.df.equals(
+            Workload.from_csv("./examples/oar_trace_server.owf").df)
+
+        w = Workload.from_csv("./tests/easy_mediumWL_smallPF.swf")
+        w.to_csv(tmpdir + "/trace.swf.xz")
+        assert Workload.from_csv(tmpdir + "/trace.swf.xz").df.equals(w.df)
+
+        js = evalys.JobSet.from_csv("./examples/jobs.csv")
+        js.to_csv(tmpdir + "/jobs.csv.bz2")
+        assert js.df.equals(
+            evalys.JobSet.from_csv(tmpdir + "/jobs.csv.bz2").df)
+
     def test_fragmentation(self):
         js_vh = evalys.JobSet.from_csv("./tests/test_frag_very_high.csv")
         very_high_frag = js_vh.fragmentation(end_time=500).mean()
@@ -53,6 +188,12 @@ class TestEvalys(unittest.TestCase):
             "./tests/test_frag_small_gaps.csv")
         assert js_small_gaps.fragmentation(end_time=500).mean() < 0.1
 
+        # the jobs running at begin_time are busy
+        gaps, = js_begin.free_resources_gaps(begin_time=10, end_time=400)
+        assert list(gaps[gaps > 0]) == [150]
+        assert js_begin.fragmentation(begin_time=10,
+                                      end_time=500).mean() == 0
+
         # test empty resources
         assert js_begin.fragmentation(begin_time=260).mean() == 0
 
@@ -70,12 +211,501 @@ class TestEvalys(unittest.TestCase):
         # Test when no event at begin or end
         util = js.mean_utilisation(begin_time=210, end_time=260)
         assert util == 0.7
+        # many windows at once
+        utils = js.mean_utilisation(begin_time=[200, 200, 235, 210],
+                                    end_time=[250, 235, 250, 260])
+        assert list(utils) == [0.7, 1, 0, 0.7]
+
+    def test_time_resolution(self):
+        import tempfile
+        import numpy as np
+        from evalys.jobset import JobSet
+        js = JobSet.from_csv("./examples/jobs.csv")
+        js_ticks = JobSet.from_csv("./examples/jobs.csv",
+                                   time_resolution=1e-6)
+        assert js_ticks.df.finish_time.dtype == np.int64
+        assert (js_ticks.df.finish_time ==
+                js_ticks.df.starting_time + js_ticks.df.execution_time).all()
+        assert np.allclose(js_ticks.utilisation.index * 1e-6,
+                           js.utilisation.index)
+        assert list(js_ticks.utilisation.load) == list(js.utilisation.load)
+        assert np.allclose(js_ticks.in_seconds().df.submission_time,
+                           js.df.submission_time)
+
+        csv = tempfile.mkdtemp() + "/jobs.csv"
+        js_ticks.to_csv(csv)
+        assert np.allclose(JobSet.from_csv(csv).df.finish_time,
+                           js.df.finish_time)
+
+        # the events of the running jobs are postponed by the same time
+        import pandas as pd
+        df = pd.DataFrame({'jobID': ['1', '2'], 'submission_time': [0., 1.],
+                           'waiting_time': [0., 1.],
+                           'execution_time': [10., -1.],
+                           'requested_number_of_resources': [1, 1],
+                           'allocated_resources': ['0', '1']})
+        js = JobSet(df)
+        js_ticks = JobSet(df, time_resolution=1e-3)
+        assert np.allclose(js_ticks.queue.index * 1e-3, js.queue.index)
+
+        # the plots are in seconds
+        import matplotlib.pyplot as plt
+        from evalys import visu
+        for plot in (visu.plot_gantt, visu.plot_lifecycle,
+                     visu.plot_details):
+            xlims = []
+            for jobset in (js, js_ticks):
+                plot(jobset)
+                xlims.append([ax.get_xlim() for ax in plt.gcf().axes])
+                plt.close()
+            assert xlims[0] == xlims[1]
+
+    def test_free_intervals(self):
+        js = evalys.JobSet.from_csv("./tests/test_frag_very_high.csv")
+        fi = js.free_intervals()
+        assert list(fi.time[:4]) == [0, 0, 35, 50]
+        assert [len(itvs) for itvs in fi.free_itvs[:4]] == [1, 0, 1, 0]
+        # the last stop event is not part of the free intervals
+        assert fi.time.iloc[-1] == 450
+
+        fi = js.free_intervals(begin_time=60, end_time=260)
+        assert fi.time.iloc[0] == 60
+        assert fi.time.iloc[-1] == 260
+        assert len(fi.free_itvs.iloc[-1]) == 0
+
+        du = js.detailed_utilisation()
+        assert list(du.total[:4]) == [0, 1, 0, 1]
+
+    def test_compute_load(self):
+        import pandas as pd
+        from evalys.metrics import compute_load
+        df = pd.DataFrame({'jobID': [1, 2, 3, 4],
+                           'submission_time': [0, 0, 5, 5],
+                           'waiting_time': [0, 10, 0, 0],
+                           'execution_time': [10, 10, -1, 5],
+                           'proc_alloc': [2, 3, 1, -1]})
+        load = compute_load(df, 'starting_time', 'finish_time', 'proc_alloc')
+        # the still running job is put 1000 after the last finish time
+        assert list(load.index) == [0, 10, 20, 1020]
+        assert list(load.load) == [2, 3, 0, 0]
+        assert list(load.area[:-1]) == [20, 30, 0]
+        queue = compute_load(df, 'submission_time', 'starting_time',
+                             'proc_alloc')
+        assert list(queue.index) == [0, 5, 10, 1020]
+        assert list(queue.load) == [3, 4, 1, 0]
+
+    def test_jobs_at(self):
+        import numpy as np
+        from evalys.workload import Workload
+        js = evalys.JobSet.from_csv("./examples/jobs.csv")
+        df = js._df
+        times = np.linspace(df.submission_time.min(), df.finish_time.max(),
+                            50)
+        for t in times[::7]:
+            running = js.jobs_running_at(t)
+            expected = df[(df.starting_time <= t) & (t <= df.finish_time)]
+            assert list(running.jobID) == list(expected.jobID)
+            assert all(isinstance(r, ProcSet)
+                       for r in running.allocated_resources)
+            queued = js.jobs_queued_at(t)
+            expected = df[(df.submission_time <= t) &
+                          (t <= df.starting_time)]
+            assert list(queued.jobID) == list(expected.jobID)
+            during = js.jobs_running_between(t, t + 500)
+            expected = df[(df.starting_time <= t + 500) &
+                          (t <= df.finish_time)]
+            assert list(during.jobID) == list(expected.jobID)
+        assert list(js.nb_jobs_running_at(times)) == [
+            len(js.jobs_running_at(t)) for t in times]
+        assert list(js.nb_jobs_queued_at(times)) == [
+            len(js.jobs_queued_at(t)) for t in times]
+
+        w = Workload.from_csv("./tests/easy_mediumWL_smallPF.swf")
+        start = w.df.submission_time + w.df.waiting_time
+        finish = start + w.df.execution_time
+        running = w.jobs_running_at(10000)
+        assert list(running.jobID) == list(
+            w.df.jobID[(start <= 10000) & (10000 <= finish)])
+        assert w.nb_jobs_running_at([10000])[0] == len(running)
+
+    def test_free_slots(self):
+        import numpy as np
+        js = evalys.JobSet.from_csv("./tests/batsim_out_jobs.csv")
+        begin, end, inf, sup = js.free_slot_arrays()
+        # the slots cover all the free area
+        du = js.detailed_utilisation()
+        nb_free = js.MaxProcs - du.total.values
+        free_area = (nb_free[:-1] * np.diff(du.index.values)).sum()
+        assert np.isclose(((end - begin) * (sup - inf + 1)).sum(), free_area)
+
+        fs = js.free_slots()
+        assert list(fs.index) == list(range(1, len(fs) + 1))
+        assert sum(len(r) for r in fs.allocated_resources) == \
+            (sup - inf + 1).sum()
+        assert (fs.execution_time == fs.finish_time - fs.starting_time).all()
+
+        # the jobs running at the beginning of the period are not free
+        for csv in ("batsim_out_jobs", "easy_mediumWL_smallPF",
+                    "oar_out_jobs"):
+            js = evalys.JobSet.from_csv("./tests/{}.csv".format(csv))
+            begin, end, inf, sup = js.free_slot_arrays(50, 300)
+            assert len(begin) > 0
+            nb_itvs = np.diff(js.alloc_offsets)
+            start = np.repeat(js.df.starting_time.values, nb_itvs)
+            finish = np.repeat(js.df.finish_time.values, nb_itvs)
+            for slot in zip(begin, end, inf, sup):
+                assert not ((start < slot[1]) & (finish > slot[0]) &
+                            (js.alloc_inf <= slot[3]) &
+                            (js.alloc_sup >= slot[2])).any()
+            # same free resources than a sweep from the beginning
+            fi = js.free_intervals()
+            before = fi.free_itvs[fi.time < 50].iloc[-1]
+            assert js.free_intervals(50, 300).free_itvs.iloc[0] == before
+
+    def test_occupancy_matrix(self):
+        import numpy as np
+        js = evalys.JobSet.from_csv("./tests/test_frag_very_high.csv")
+        occupancy = js.occupancy_matrix(bin_width=50, begin_time=0,
+                                        end_time=500)
+        assert occupancy.dtype == np.float32
+        assert occupancy.shape == (len(js.res_bounds), 10)
+        # the busy area is the area under the utilisation
+        util = js.utilisation
+        area = util.area.sum()
+        assert np.isclose(occupancy.sum() * 50, area)
+
+        chunks = js.iter_occupancy_matrix(bin_width=50, begin_time=0,
+                                          end_time=500, max_memory=10)
+        assert np.allclose(np.concatenate([c for _, c in chunks]), occupancy)
+        # many weights in a single pass
+        weights = np.random.RandomState(0).rand(len(js.df), 2)
+        stacked = np.concatenate([c for _, c in js.iter_occupancy_matrix(
+            bin_width=50, begin_time=0, end_time=500, weights=weights)])
+        for column in range(2):
+            weighted = np.concatenate([c for _, c in js.iter_occupancy_matrix(
+                bin_width=50, begin_time=0, end_time=500,
+                weights=weights[:, column])])
+            assert np.allclose(stacked[..., column], weighted)
+        # the dense matrix does not fit in the memory budget
+        with self.assertRaises(ValueError):
+            js.occupancy_matrix(bin_width=50, begin_time=0, end_time=500,
+                                max_memory=10)
+
+    def test_gantt(self):
+        import matplotlib.pyplot as plt
+        from matplotlib.collections import PolyCollection
+        from evalys.visu import core, gantt, legacy
+        js = evalys.JobSet.from_csv("./examples/jobs.csv")
+        nb_itvs = len(js.alloc_inf)
+
+        # small rectangles are not labeled
+        nb_labels = []
+        for figsize in ((4, 3), (80, 60)):
+            layout = core.SimpleLayout()
+            layout.fig.set_size_inches(figsize)
+            plot = layout.inject(gantt.GanttVisualization, spskey='all')
+            plot.build(js)
+            rects, = plot._ax.collections
+            assert isinstance(rects, PolyCollection)
+            assert len(rects.get_paths()) == nb_itvs
+            nb_labels.append(len(plot._ax.texts))
+            plt.close(layout.fig)
+        assert 0 < nb_labels[0] < nb_labels[1] == nb_itvs
+
+        _, ax = plt.subplots()
+        legacy.plot_gantt(js, ax=ax, labels=False)
+        rects, = ax.collections
+        assert len(rects.get_paths()) == nb_itvs
+        assert not ax.texts
+        plt.close(ax.figure)
+
+    def test_gantt_raster(self):
+        import numpy as np
+        import matplotlib.pyplot as plt
+        from evalys.visu import core, gantt
+        js = evalys.JobSet.from_csv("./examples/jobs.csv")
+
+        layout = core.SimpleLayout()
+        plot = layout.inject(gantt.GanttVisualization, spskey='all')
+        plot.raster_threshold = len(js.df) - 1
+        plot.build(js)
+        image, = plot._ax.images
+        assert not plot._ax.collections
+        assert not plot._ax.texts
+        rgba = image.get_array()
+        assert rgba.shape[0] == len(js.res_bounds)
+        # opaque where busy, transparent where idle
+        busy = js.occupancy_matrix(
+            (js.df.finish_time.max() - js.df.starting_time.min()) /
+            rgba.shape[1])
+        assert np.allclose(rgba[..., 3], np.minimum(plot.alpha * busy, 1),
+                           atol=1e-5)
+        plt.close(layout.fig)
+
+        # painted again at the final size of the figure
+        from evalys.visu import legacy
+        fig, ax = plt.subplots()
+        legacy.plot_gantt(js, ax=ax, raster=True)
+        fig.set_size_inches(20, 10)
+        fig.set_tight_layout(True)
+        fig.canvas.draw()
+        image, = ax.images
+        assert image.get_array().shape[1] == int(ax.get_window_extent().width)
+        plt.close(fig)
+
+    def test_zoom(self):
+        import matplotlib.pyplot as plt
+        from evalys.visu import core, gantt, series
+        js = evalys.JobSet.from_csv("./examples/jobs.csv")
+
+        layout = core.SimpleLayout()
+        plot = layout.inject(gantt.GanttVisualization, spskey='all')
+        plot.raster_threshold = 50
+        plot.build(js)
+        assert len(plot._ax.images) == 1
+        # zoomed in: the few visible jobs are drawn and labeled
+        begin = js.df.starting_time.min()
+        layout.fig.set_size_inches(40, 30)
+        plot._ax.set_xlim(begin, begin + 300)
+        layout.fig.canvas.draw()
+        visible = js.jobs_running_between(begin, begin + 300)
+        assert not plot._ax.images
+        rects, = plot._ax.collections
+        assert len(rects.get_paths()) == len(plot._ax.texts) > 0
+        assert set(text.get_text() for text in plot._ax.texts) == \
+            set(visible.jobID)
+        # small rectangles are not labeled
+        layout.fig.set_size_inches(4, 3)
+        plot._ax.set_xlim(begin, begin + 301)
+        layout.fig.canvas.draw()
+        rects, = plot._ax.collections
+        assert 0 < len(plot._ax.texts) < len(rects.get_paths())
+
+        # one redraw per view change, none for the y limits of an image
+        redraws = []
+        redraw = plot._redraw
+        plot._redraw = lambda: redraws.append(1) or redraw()
+        plot._ax.set(xlim=(begin, begin + 600), ylim=(0, 50))
+        layout.fig.canvas.draw()
+        layout.fig.canvas.draw()
+        assert len(redraws) == 1
+        plot._ax.set_xlim(begin, begin + 36000)
+        layout.fig.canvas.draw()
+        assert len(plot._ax.images) == 1
+        plot._ax.set_ylim(0, 60)
+        layout.fig.canvas.draw()
+        assert len(redraws) == 2
+        plt.close(layout.fig)
+
+        layout = core.SimpleLayout()
+        plot = layout.inject(series.SeriesVisualization.factory('queue'),
+                             spskey='all')
+        plot.build(js, 'queue')
+        line, x, y = plot._series
+        plot._ax.set_xlim(x[10], x[20])
+        assert list(line.get_xdata()) == list(x[10:21])
+        plt.close(layout.fig)
+
+        # the series is decimated when zooming only if requested
+        for decimate in (False, True):
+            layout = core.SimpleLayout()
+            layout.fig.set_size_inches(1, 3)
+            plot = layout.inject(
+                series.SeriesVisualization.factory('queue'), spskey='all')
+            plot.decimate = decimate
+            plot.build(js, 'queue')
+            line, x, y = plot._series
+            plot._ax.set_xlim(x[0], x[-1])
+            assert (len(line.get_xdata()) == len(x)) != decimate
+            plt.close(layout.fig)
+
+    def test_lifecycle_links(self):
+        import matplotlib.pyplot as plt
+        from evalys.visu import core, lifecycle
+        js = evalys.JobSet.from_csv("./examples/jobs.csv")
+
+        for links, nb_links in (('all', len(js.df)), ('subsample', 10)):
+            layout = core.SimpleLayout()
+            plot = layout.inject(lifecycle.LifecycleVisualization,
+                                 spskey='all')
+            plot.links = links
+            plot.max_links = 10
+            plot.build(js)
+            layout.fig.canvas.draw()
+            collections = layout.fig.artists
+            assert len(collections) == 2
+            assert all(len(c.get_segments()) == nb_links
+                       for c in collections)
+            plt.close(layout.fig)
+
+    def test_job_details(self):
+        import matplotlib.pyplot as plt
+        from matplotlib.collections import LineCollection, PolyCollection
+        from evalys.visu import legacy
+        from evalys.workload import Workload
+        w = Workload.from_csv("./tests/easy_mediumWL_smallPF.swf")
+        size = w.df.proc_alloc.max()
+
+        _, ax = plt.subplots()
+        legacy.plot_job_details(w.df, size, ax=ax)
+        links = [c for c in ax.collections if isinstance(c, LineCollection)]
+        assert len(links) == 2
+        assert all(len(c.get_segments()) == len(w.df) for c in links)
+        plt.close()
+
+        _, ax = plt.subplots()
+        legacy.plot_job_details(w.df, size, ax=ax, density=True)
+        assert len(ax.collections) == 3
+        assert all(isinstance(c, PolyCollection) for c in ax.collections)
+        plt.close()
+
+        w.MaxProcs = size
+        w.TimeZoneString = 'UTC'
+        w.plot(with_details=True)
+        plt.close()
+
+    def test_load_decimation(self):
+        import numpy as np
+        import pandas as pd
+        import matplotlib.pyplot as plt
+        from evalys.visu import legacy
+        random = np.random.RandomState(0)
+        load = pd.DataFrame(
+            {'load': random.randint(1, 100, 100000)},
+            index=pd.Index(np.cumsum(random.randint(1, 10, 100000)),
+                           name='time'))
+        load.iloc[5000] = 0
+
+        _, ax = plt.subplots()
+        legacy.plot_load(load, 100, ax=ax, decimate=True)
+        y = ax.get_lines()[0].get_ydata()
+        assert len(y) < len(load) / 10
+        assert y.max() == load.load.max()
+        assert y.min() == 0
+        plt.close()
+
+    def test_map_unique_numbers(self):
+        import pandas as pd
+        import matplotlib.pyplot as plt
+        from evalys.visu import legacy
+        df = pd.DataFrame({
+            'workload_name': ['w', 'w', 'x', 'w', 'w', 'w'],
+            'jobID': [1, 2, 1, 1, 2, 1],
+            'allocated_resources': [ProcSet(1), ProcSet(), ProcSet(2),
+                                    ProcSet(3), ProcSet(), ProcSet(4)],
+        }, index=range(10, 16))
+        labeled_jobs, unique_numbers = legacy.map_unique_numbers(df)
+        assert unique_numbers == [1, 2, 3, 1, 2, 1]
+        assert labeled_jobs == {12, 13}
+
+        # small rectangles are not labeled
+        js = evalys.JobSet.from_csv("./examples/jobs.csv")
+        nb_labels = []
+        for figsize in ((4, 3), (40, 30)):
+            _, ax = plt.subplots(figsize=figsize)
+            legacy.plot_gantt(js, ax=ax)
+            nb_labels.append(len(ax.texts))
+            plt.close()
+        assert 0 < nb_labels[0] < nb_labels[1]
+
+    def test_epoch_to_datenum(self):
+        import numpy as np
+        import pandas as pd
+        import matplotlib.dates
+        from evalys.visu import core
+        seconds = np.array([0, 1497287706.5, 1.6e9])
+        assert np.allclose(
+            core.epoch_to_datenum(seconds),
+            matplotlib.dates.date2num(pd.to_datetime(seconds, unit='s')))
+        assert np.allclose(
+            core.epoch_to_datenum(seconds - 100, 100, 'Europe/Paris'),
+            matplotlib.dates.date2num(
+                pd.to_datetime(seconds, unit='s', utc=True)
+                .tz_convert('Europe/Paris').tz_localize(None)))
+        assert np.allclose(
+            core.datenum_to_epoch(core.epoch_to_datenum(seconds, 10), 10),
+            seconds)
+
+    def test_plot_details(self):
+        import numpy as np
+        import matplotlib.pyplot as plt
+        from evalys.visu import core, details
+        js = evalys.JobSet.from_csv("./examples/jobs.csv")
+        prepared = core.PreparedJobSet(js)
+        assert core.PreparedJobSet.of(prepared) is prepared
+        assert list(prepared.column('jobsize')) == \
+            list(js.df.allocated_resources.apply(len))
+        df = prepared.frame(['jobsize', 'starting_time'], xscale='time')
+        assert np.allclose(df.starting_time,
+                           core.epoch_to_datenum(js.df.starting_time))
+        assert np.shares_memory(prepared.frame(['jobsize'])['jobsize'].values,
+                                prepared.column('jobsize'))
+
+        details.plot_details(js, xscale='time')
+        assert len({ax.get_xlim() for ax in plt.gcf().axes}) == 1
+        plt.close()
+
+    def test_stream_metrics(self):
+        import pandas as pd
+        js = evalys.JobSet.from_csv("./examples/jobs.csv")
+        chunks = list(evalys.JobSet.iter_csv("./examples/jobs.csv",
+                                             chunksize=10))
+        assert sum(len(chunk.df) for chunk in chunks) == len(js.df)
+
+        metrics = evalys.JobSet.stream_metrics("./examples/jobs.csv",
+                                               chunksize=10)
+        pd.testing.assert_frame_equal(metrics['utilisation'], js.utilisation)
+        pd.testing.assert_frame_equal(metrics['queue'], js.queue)
+        assert abs(metrics['mean_waiting_time'] -
+                   js.df.waiting_time.mean()) < 1e-9
+
+        # chunks in any order, with events at the same times
+        from evalys.metrics import LoadAccumulator
+        df = js.df.sample(frac=1, random_state=0)
+        utilisation = LoadAccumulator('starting_time', 'finish_time',
+                                      'proc_alloc')
+        for start in range(0, len(df), 7):
+            utilisation.add(df.iloc[start:start + 7])
+        pd.testing.assert_frame_equal(utilisation.load, js.utilisation)
 
     def test_cumulative_waiting_time(self):
         from evalys.metrics import cumulative_waiting_time
         js_begin = evalys.JobSet.from_csv("./tests/test_frag_begin.csv")
         assert cumulative_waiting_time(js_begin.df).max() == 62.5 + 125.0 + 187.5
 
+    def test_import_time(self):
+        import subprocess
+        import sys
+        # a fresh interpreter, the plotting libraries are already loaded
+        # here
+        script = (
+            "import sys, time\n"
+            "begin = time.time()\n"
+            "import evalys.jobset, evalys.workload, evalys.metrics\n"
+            "import evalys.utils, evalys.mstates, evalys.pstates\n"
+            "print(time.time() - begin)\n"
+            "print(' '.join(sorted(sys.modules)))\n")
+        output = subprocess.check_output([sys.executable, "-c", script],
+                                         universal_newlines=True)
+        duration, modules = output.splitlines()
+        loaded = {module.split('.')[0] for module in modules.split()}
+        assert not loaded & {'matplotlib', 'seaborn', 'statsmodels'}
+        assert float(duration) < 10
+
+    def test_cli(self):
+        import os
+        import subprocess
+        import sys
+        import tempfile
+        output = tempfile.mkdtemp() + "/gantt.png"
+        env = dict(os.environ)
+        env.pop('DISPLAY', None)
+        # Batsim outputs have no workload_name column
+        subprocess.check_call([sys.executable, "-m", "evalys.evalys", "-g",
+                               "./tests/batsim_out_jobs.csv", "-o", output],
+                              env=env, stdout=subprocess.DEVNULL)
+        assert os.path.getsize(output) > 0
+
     @classmethod
     def teardown_class(cls):
         pass